@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analysis'
+
+    def ready(self):
+        # Connect the Video receivers in every process, including Celery workers
+        from . import signals  # noqa: F401
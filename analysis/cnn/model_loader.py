@@ -1,22 +1,57 @@
 import os
 import json
-import h5py
+import tempfile
 import numpy as np
-import tensorflow as tf
 
-class CustomBatchNormalization(tf.keras.layers.BatchNormalization):
-    def __init__(self, axis=3, **kwargs):
-        # Handle list axis parameter
-        if isinstance(axis, list):
-            axis = axis[0]  # Take first element if it's a list
-        super().__init__(axis=axis, **kwargs)
-    
-    @classmethod
-    def from_config(cls, config):
-        # Fix axis parameter in config
-        if 'axis' in config and isinstance(config['axis'], list):
+# TensorFlow and h5py are imported inside the functions that need them so that
+# importing this module does not pay TensorFlow's multi-second startup cost
+
+def fix_batch_norm_axis(layer_config):
+    """json.loads object_hook that turns a list BatchNormalization axis into an int"""
+    if layer_config.get('class_name') == 'BatchNormalization':
+        config = layer_config.get('config')
+        if isinstance(config, dict) and isinstance(config.get('axis'), list):
             config['axis'] = config['axis'][0]
-        return super(CustomBatchNormalization, cls).from_config(config)
+    return layer_config
+
+def fix_model_file_axis(model_path):
+    """
+    Rewrite the model_config stored in an H5 file so BatchNormalization axes
+    are plain integers. Returns False if the file has no model_config.
+    """
+    import h5py
+    
+    with h5py.File(model_path, 'r+') as h5file:
+        if 'model_config' not in h5file.attrs:
+            return False
+        
+        raw_config = h5file.attrs['model_config']
+        if isinstance(raw_config, bytes):
+            raw_config = raw_config.decode('utf-8')
+        fixed_config = json.loads(raw_config, object_hook=fix_batch_norm_axis)
+        h5file.attrs.modify('model_config', json.dumps(fixed_config).encode('utf-8'))
+    return True
+
+def load_weights_from_open_h5(model, h5file, model_path):
+    """
+    Load weights from an already open H5 handle instead of reopening the file.
+    The handle is read through Keras' private legacy H5 loader, which moves
+    between releases, so any Keras without it loads by path instead.
+    """
+    try:
+        from keras.src.legacy.saving.legacy_h5_format import load_weights_from_hdf5_group
+    except ImportError:
+        model.load_weights(model_path)
+        return
+    
+    weights_group = h5file
+    if 'layer_names' not in h5file.attrs and 'model_weights' in h5file:
+        weights_group = h5file['model_weights']
+    try:
+        load_weights_from_hdf5_group(weights_group, model)
+    except TypeError:
+        # The private loader's signature differs from the Keras 3 one used here
+        model.load_weights(model_path)
 
 def load_model_with_fixes(model_path):
     """Try multiple approaches to load the model"""
@@ -25,14 +60,16 @@ def load_model_with_fixes(model_path):
     if not os.path.exists(model_path):
         print(f"Model file not found: {model_path}")
         return None
+    
+    import h5py
+    import tensorflow as tf
         
-    # Approach 1: Use custom objects with clear registration
+    # Approach 1: Plain load of a model already fixed with fix_model_file_axis
     try:
-        print("Trying approach 1: Custom objects with explicit registration")
-        with tf.keras.utils.custom_object_scope({'BatchNormalization': CustomBatchNormalization}):
-            model = tf.keras.models.load_model(model_path, compile=False)
-            print("Model loaded successfully with approach 1!")
-            return model
+        print("Trying approach 1: Plain load of a fixed model file")
+        model = tf.keras.models.load_model(model_path, compile=False)
+        print("Model loaded successfully with approach 1!")
+        return model
     except Exception as e:
         print(f"Approach 1 failed: {str(e)}")
     
@@ -43,75 +80,125 @@ def load_model_with_fixes(model_path):
         with h5py.File(model_path, 'r') as h5file:
             # Check if it contains model_config
             if 'model_config' in h5file.attrs:
-                model_config = json.loads(h5file.attrs['model_config'].decode('utf-8'))
-                
-                # Modify BatchNormalization layers in the config
-                def fix_batch_norm_config(config):
-                    if isinstance(config, dict):
-                        if config.get('class_name') == 'BatchNormalization' and 'config' in config:
-                            if 'axis' in config['config'] and isinstance(config['config']['axis'], list):
-                                config['config']['axis'] = config['config']['axis'][0]
-                        
-                        # Process nested dictionaries
-                        for key, value in config.items():
-                            if isinstance(value, (dict, list)):
-                                config[key] = fix_batch_norm_config(value)
-                    
-                    elif isinstance(config, list):
-                        # Process lists
-                        for i, item in enumerate(config):
-                            if isinstance(item, (dict, list)):
-                                config[i] = fix_batch_norm_config(item)
-                    
-                    return config
-                
-                # Apply fixes to the model config
-                fixed_config = fix_batch_norm_config(model_config)
+                # Fix BatchNormalization layers while the config is being parsed
+                fixed_config = json.loads(
+                    h5file.attrs['model_config'].decode('utf-8'),
+                    object_hook=fix_batch_norm_axis
+                )
                 
                 # Create model from fixed config
                 fixed_model = tf.keras.models.model_from_json(json.dumps(fixed_config))
                 
-                # Load weights
-                fixed_model.load_weights(model_path)
+                # Load weights through the same handle to avoid a second HDF5 open
+                load_weights_from_open_h5(fixed_model, h5file, model_path)
                 print("Model loaded successfully with approach 2!")
                 return fixed_model
     except Exception as e:
         print(f"Approach 2 failed: {str(e)}")
     
-    # Approach 3: Use SavedModel format as intermediate step
-    try:
-        print("Trying approach 3: Convert through SavedModel format")
-        # Create a temporary directory
-        import tempfile
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_saved_model = os.path.join(temp_dir, "temp_model")
-            
-            # Use low-level TF ops to load and save the model
-            with tf.keras.utils.custom_object_scope({'BatchNormalization': CustomBatchNormalization}):
-                try:
-                    # First attempt to load with custom objects
-                    model = tf.keras.models.load_model(model_path, compile=False)
-                except:
-                    # If that fails, try loading as a generic model without custom layers
-                    model = tf.keras.models.load_model(
-                        model_path,
-                        custom_objects={'BatchNormalization': tf.keras.layers.BatchNormalization},
-                        compile=False
-                    )
-                
-                # Save as SavedModel format
-                model.save(temp_saved_model, save_format='tf')
-                
-                # Reload from SavedModel format
-                reloaded_model = tf.keras.models.load_model(temp_saved_model)
-                print("Model loaded successfully with approach 3!")
-                return reloaded_model
-    except Exception as e:
-        print(f"Approach 3 failed: {str(e)}")
-        
     print("All approaches failed to load the model.")
     return None
 
+def representative_dataset(image_paths):
+    """Yield normalized 48x48 grayscale samples used to calibrate int8 quantization"""
+    import cv2
+    
+    for image_path in image_paths:
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        img = cv2.resize(img, (48, 48), interpolation=cv2.INTER_AREA).astype(np.float32)
+        np.multiply(img, np.float32(1.0 / 255.0), out=img)
+        yield [img.reshape(1, 48, 48, 1)]
+
+def write_file_atomically(path, data):
+    """
+    Write data to a temporary file next to path and move it into place, so
+    processes warming up at the same time never read a truncated file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def get_cached_runtime(model_path, calibration_images=None, float16=False):
+    """
+    Return a TFLite interpreter for the model, converting the H5 file on first use.
+    When calibration_images is given, the model is fully quantized to int8
+    (weights and activations) and cached separately as <model>.int8.tflite.
+    With float16, weights are stored as float16 and cached as <model>.fp16.tflite.
+    """
+    import tensorflow as tf
+    
+    quantize = bool(calibration_images)
+    if quantize:
+        tflite_path = model_path + ".int8.tflite"
+    elif float16:
+        tflite_path = model_path + ".fp16.tflite"
+    else:
+        tflite_path = model_path + ".tflite"
+    
+    if (not os.path.exists(tflite_path)
+            or os.path.getmtime(tflite_path) < os.path.getmtime(model_path)):
+        print(f"Converting {model_path} to TFLite...")
+        model = load_model_with_fixes(model_path)
+        if model is None:
+            return None
+        
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantize:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: representative_dataset(calibration_images)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        elif float16:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        write_file_atomically(tflite_path, converter.convert())
+        print(f"Saved TFLite model to {tflite_path}")
+    
+    with open(tflite_path, 'rb') as f:
+        interpreter = tf.lite.Interpreter(model_content=f.read())
+    interpreter.allocate_tensors()
+    return interpreter
+
+def run_tflite(interpreter, batch):
+    """
+    Run a (N, 48, 48, 1) float32 batch through a TFLite interpreter and return
+    float32 probabilities, quantizing the input and dequantizing the output
+    for int8 models
+    """
+    input_details = interpreter.get_input_details()[0]
+    if tuple(input_details['shape']) != batch.shape:
+        # Resize the input tensor when the batch size changes
+        interpreter.resize_tensor_input(input_details['index'], batch.shape)
+        interpreter.allocate_tensors()
+    
+    # Write straight into the interpreter's input buffer. The view must be released
+    # before invoke(), so it is only held for the duration of the assignment.
+    input_type = input_details['dtype']
+    if input_type != np.float32:
+        scale, zero_point = input_details['quantization']
+        limits = np.iinfo(input_type)
+        quantized = np.round(batch / scale + zero_point)
+        np.clip(quantized, limits.min, limits.max, out=quantized)
+        interpreter.tensor(input_details['index'])()[...] = quantized
+    else:
+        interpreter.tensor(input_details['index'])()[...] = batch
+    interpreter.invoke()
+    
+    output_details = interpreter.get_output_details()[0]
+    output = interpreter.get_tensor(output_details['index'])
+    if output_details['dtype'] != np.float32:
+        scale, zero_point = output_details['quantization']
+        output = (output.astype(np.float32) - zero_point) * scale
+    return output
+
 # Test the function
 if __name__ == "__main__":
     model_path = "analysis/cnn/model.h5"
@@ -0,0 +1,166 @@
+import os
+import queue
+import tempfile
+import threading
+import numpy as np
+
+# Process-wide (model, infer) pairs keyed by model path and backend, so every
+# detector in a worker shares one loaded model and one inference function
+_RUNTIMES = {}
+_RUNTIMES_LOCK = threading.Lock()
+
+# Backends accepted by get_runtime
+BACKENDS = ('tensorflow', 'tflite-fp16', 'tflite-int8', 'onnx')
+
+# XLA compiles the graph once per input shape, so batches are padded to this size
+XLA_BATCH_SIZE = 32
+
+def _pad_batches(infer, batch_size=XLA_BATCH_SIZE):
+    """
+    Wrap infer so every call sees batches of exactly batch_size frames: short
+    batches are zero-padded and long ones split, and the padding rows are
+    dropped from the output
+    """
+    def padded_infer(batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        outputs = []
+        for start in range(0, len(batch), batch_size):
+            chunk = batch[start:start + batch_size]
+            if len(chunk) < batch_size:
+                padding = np.zeros((batch_size - len(chunk),) + chunk.shape[1:], dtype=np.float32)
+                chunk = np.concatenate((chunk, padding))
+            outputs.append(np.asarray(infer(chunk)))
+        return np.concatenate(outputs)[:len(batch)]
+    return padded_infer
+
+def _load_runtime(model_path):
+    """Load the model, wrap it in a tf.function and run one warm-up inference"""
+    import tensorflow as tf
+    from analysis.cnn.model_loader import load_model_with_fixes
+
+    # Model files not yet fixed with `manage.py fix_model_axis` are repaired while loading
+    model = load_model_with_fixes(model_path)
+    if model is None:
+        raise RuntimeError(f"Could not load the emotion model from {model_path}")
+    for jit_compile in (True, False):
+        # XLA fuses the small CNN into a few kernels; builds without it fall back to plain graphs
+        infer = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec((None, 48, 48, 1), tf.float32)],
+            jit_compile=jit_compile
+        )
+        if jit_compile:
+            # Keep one batch shape so variable final and reuse batches do not recompile
+            infer = _pad_batches(infer)
+        try:
+            # Trace the graph and pick kernels now rather than on the first real frame
+            infer(np.zeros((1, 48, 48, 1), np.float32))
+        except Exception:
+            if not jit_compile:
+                raise
+            continue
+        return model, infer
+
+def _load_tflite_runtime(model_path, **conversion):
+    """
+    Convert the model to TFLite once and return an inference function backed by
+    a pool of interpreters. An interpreter is not thread-safe, so each
+    concurrent call borrows its own and hands it back afterwards.
+    """
+    from analysis.cnn.model_loader import get_cached_runtime, run_tflite
+
+    interpreter = get_cached_runtime(model_path, **conversion)
+    if interpreter is None:
+        raise RuntimeError(f"Could not convert {model_path} to TFLite")
+    interpreters = queue.SimpleQueue()
+    interpreters.put(interpreter)
+
+    def infer(batch):
+        try:
+            borrowed = interpreters.get_nowait()
+        except queue.Empty:
+            borrowed = get_cached_runtime(model_path, **conversion)
+        try:
+            return run_tflite(borrowed, batch)
+        finally:
+            interpreters.put(borrowed)
+
+    infer(np.zeros((1, 48, 48, 1), np.float32))
+    return interpreter, infer
+
+def _load_onnx_runtime(model_path):
+    """
+    Convert the model to ONNX once, cached as <model>.onnx, and return an ONNX
+    Runtime session with every graph optimization enabled. Needs the optional
+    onnxruntime and tf2onnx packages.
+    """
+    import onnxruntime as ort
+
+    onnx_path = model_path + ".onnx"
+    if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+        import tensorflow as tf
+        import tf2onnx
+        from analysis.cnn.model_loader import load_model_with_fixes
+
+        model = load_model_with_fixes(model_path)
+        if model is None:
+            raise RuntimeError(f"Could not load the emotion model from {model_path}")
+        # Convert next to the target and move it into place, so workers converting
+        # at the same time never open a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(onnx_path), suffix='.onnx.tmp')
+        os.close(fd)
+        try:
+            tf2onnx.convert.from_keras(
+                model,
+                input_signature=[tf.TensorSpec((None, 48, 48, 1), tf.float32, name='input')],
+                opset=17,
+                output_path=tmp_path
+            )
+            os.replace(tmp_path, onnx_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+
+    # Session.run is thread-safe, so concurrent frame ranges share one session
+    def infer(batch):
+        return session.run(None, {input_name: batch})[0]
+
+    infer(np.zeros((1, 48, 48, 1), np.float32))
+    return session, infer
+
+def get_runtime(model_path, backend='tensorflow', calibration_images=None):
+    """
+    Return the shared (model, infer) pair for model_path, loading it on first use.
+    infer takes a (N, 48, 48, 1) float32 batch and returns array-like probabilities.
+    The tflite-int8 backend needs calibration_images, face crops used to pick the
+    activation ranges, the first time its conversion is built.
+    """
+    key = (model_path, backend)
+    runtime = _RUNTIMES.get(key)
+    if runtime is None:
+        with _RUNTIMES_LOCK:
+            runtime = _RUNTIMES.get(key)
+            if runtime is None:
+                if backend == 'tensorflow':
+                    runtime = _load_runtime(model_path)
+                elif backend == 'tflite-fp16':
+                    runtime = _load_tflite_runtime(model_path, float16=True)
+                elif backend == 'tflite-int8':
+                    if not calibration_images:
+                        raise ValueError("The tflite-int8 backend needs calibration images")
+                    runtime = _load_tflite_runtime(model_path, calibration_images=calibration_images)
+                elif backend == 'onnx':
+                    runtime = _load_onnx_runtime(model_path)
+                else:
+                    raise ValueError(f"Unknown model backend {backend!r}, expected one of {BACKENDS}")
+                _RUNTIMES[key] = runtime
+    return runtime
+
+def get_infer(model_path, backend='tensorflow', calibration_images=None):
+    """Return the shared inference function, taking a (N, 48, 48, 1) float32 batch"""
+    return get_runtime(model_path, backend, calibration_images)[1]
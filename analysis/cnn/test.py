@@ -1,59 +1,73 @@
 import os
-import cv2
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import BatchNormalization
+from model_loader import get_cached_runtime, run_tflite
 
-# Enhanced CustomBatchNormalization to handle all serialization issues
-class CustomBatchNormalization(BatchNormalization):
-    def __init__(self, **kwargs):
-        # Handle axis parameter format differences
-        if 'axis' in kwargs:
-            if isinstance(kwargs['axis'], list):
-                kwargs['axis'] = kwargs['axis'][0]
-        super(CustomBatchNormalization, self).__init__(**kwargs)
-        
-    # Add custom from_config and get_config methods
-    @classmethod
-    def from_config(cls, config):
-        # Ensure axis is an integer
-        if 'axis' in config and isinstance(config['axis'], list):
-            config['axis'] = config['axis'][0]
-        return super(CustomBatchNormalization, cls).from_config(config)
+# Emotion labels in the three-emotion model's output order
+EMOTION_LABELS = ["angry", "sad", "happy"]
+
+# Number of webcam frames pushed through the model per inference call
+WEBCAM_BATCH_SIZE = 4
 
-def predict_emotion(image_path, model):
-    # Update emotion labels to match the three-emotion model
-    emotion_labels = ["angry", "sad", "happy"]
+def predict_emotion(image_path, interpreter):
+    import cv2
     
     img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    img = cv2.resize(img, (48, 48)) / 255.0
+    # Normalize in float32 directly to avoid a float64 temporary and TF's upcast
+    img = cv2.resize(img, (48, 48), interpolation=cv2.INTER_AREA).astype(np.float32)
+    np.multiply(img, np.float32(1.0 / 255.0), out=img)
     img = img.reshape(1, 48, 48, 1)
 
-    prediction = model.predict(img)
-    emotion = emotion_labels[np.argmax(prediction)]
+    prediction = run_tflite(interpreter, img)
+    emotion = EMOTION_LABELS[np.argmax(prediction)]
     confidence = np.max(prediction)
     
     return emotion, confidence
 
-def test_emotion_detection(model_path, image_path=None, use_webcam=False):
-    # Update emotion labels to match the three-emotion model
-    emotion_labels = ["angry", "sad", "happy"]
+def build_preprocess_fn():
+    """Build a tf.function converting BGR uint8 frame batches into normalized 48x48 grayscale input"""
+    import tensorflow as tf
     
+    @tf.function(input_signature=[tf.TensorSpec((None, None, None, 3), tf.uint8)])
+    def preprocess_frames(frames):
+        rgb = tf.cast(tf.reverse(frames, axis=[-1]), tf.float32)
+        gray = tf.image.rgb_to_grayscale(rgb)
+        resized = tf.image.resize(gray, (48, 48), method='area')
+        return resized * (1.0 / 255.0)
+    
+    return preprocess_frames
+
+def process_frames(frames, preprocess_frames, interpreter):
+    """Return an (emotion, confidence) pair for each BGR frame in a uint8 batch"""
+    import tensorflow as tf
+    
+    # Convert to grayscale, resize and normalize the batch in one graph call
+    batch = preprocess_frames(tf.convert_to_tensor(frames)).numpy()
+    
+    # Get predictions for the whole batch in a single call
+    predictions = run_tflite(interpreter, batch)
+    max_indices = predictions.argmax(axis=1)
+    return [
+        (EMOTION_LABELS[max_index], frame_predictions[max_index])
+        for max_index, frame_predictions in zip(max_indices, predictions)
+    ]
+
+def test_emotion_detection(model_path, image_path=None, use_webcam=False, render=False,
+                           calibration_images=None):
+    """
+    Run the emotion model on a webcam feed or a single image.
+    Results are drawn in an OpenCV window only when render is True,
+    otherwise they are printed so the loop can run headless.
+    Passing calibration_images runs an int8-quantized copy of the model.
+    """
     try:
-        # Load model with custom BatchNormalization implementation
+        import cv2
+        
+        # Load the cached TFLite conversion of the model
         print(f"Loading model from {model_path}...")
-        model = load_model(
-            model_path, 
-            custom_objects={'BatchNormalization': CustomBatchNormalization},
-            compile=False
-        )
-        model.compile(
-            # Update optimizer to match training parameters
-            optimizer=tf.keras.optimizers.Adam(learning_rate=0.0001),
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        interpreter = get_cached_runtime(model_path, calibration_images)
+        if interpreter is None:
+            print("Error: Could not load model")
+            return
         print("Model loaded successfully")
         
         if use_webcam:
@@ -63,35 +77,54 @@ def test_emotion_detection(model_path, image_path=None, use_webcam=False):
                 print("Error: Could not open webcam")
                 return
                 
-            print("Press 'q' to exit")
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                    
-                # Process frame (convert to grayscale and resize)
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                resized = cv2.resize(gray, (48, 48)) / 255.0
-                img_array = resized.reshape(1, 48, 48, 1)
+            preprocess_frames = build_preprocess_fn()
+            frame_batch = None
+            batch_count = 0
+            quit_requested = False
                 
-                # Get predictions
-                predictions = model.predict(img_array, verbose=0)
+            print("Press 'q' to exit" if render else "Press Ctrl+C to exit")
+            while not quit_requested:
+                if frame_batch is None:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    # Allocate the raw frame buffer once, sized from the first frame
+                    frame_batch = np.empty((WEBCAM_BATCH_SIZE,) + frame.shape, np.uint8)
+                    frame_batch[0] = frame
+                else:
+                    # Decode straight into the next slot of the reused buffer
+                    slot = frame_batch[batch_count]
+                    ret, frame = cap.read(slot)
+                    if not ret:
+                        break
+                    if not np.shares_memory(frame, slot):
+                        slot[...] = frame
+                batch_count += 1
                 
-                # Display results on frame
-                max_index = np.argmax(predictions[0])
-                max_emotion = emotion_labels[max_index]
-                max_prob = np.max(predictions[0])
+                # Wait until a full batch has been collected
+                if batch_count < WEBCAM_BATCH_SIZE:
+                    continue
                 
-                cv2.putText(frame, f"{max_emotion}: {max_prob:.2f}", 
-                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                results = process_frames(frame_batch, preprocess_frames, interpreter)
+                
+                for buffered_frame, (max_emotion, max_prob) in zip(frame_batch, results):
+                    if not render:
+                        print(f"{max_emotion}: {max_prob:.2f}")
+                        continue
+                    
+                    # Display results on the frame
+                    cv2.putText(buffered_frame, f"{max_emotion}: {max_prob:.2f}", 
+                                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                    cv2.imshow('Emotion Detection', buffered_frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        quit_requested = True
+                        break
                 
-                # Show frame
-                cv2.imshow('Emotion Detection', frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                batch_count = 0
                     
             cap.release()
-            cv2.destroyAllWindows()
+            if render:
+                cv2.destroyAllWindows()
             
         elif image_path:
             # Process single image
@@ -99,8 +132,10 @@ def test_emotion_detection(model_path, image_path=None, use_webcam=False):
                 print(f"Error: Image file not found at {image_path}")
                 return
                 
-            emotion, confidence = predict_emotion(image_path, model)
+            emotion, confidence = predict_emotion(image_path, interpreter)
             print(f"Predicted Emotion: {emotion} (Confidence: {confidence:.4f})")
+            if not render:
+                return
                 
             # Display image with prediction
             img = cv2.imread(image_path)
@@ -119,7 +154,11 @@ if __name__ == "__main__":
     
     # Choose one of the following options:
     # 1. Test with a single image
-    test_emotion_detection(model_path, image_path="analysis/cnn/test_images/sad_test.jpg")
+    test_emotion_detection(model_path, image_path="analysis/cnn/test_images/sad_test.jpg", render=True)
     
     # 2. Test with webcam
-    # test_emotion_detection(model_path, use_webcam=True)
\ No newline at end of file
+    # test_emotion_detection(model_path, use_webcam=True, render=True)
+    
+    # 3. Test an int8-quantized model calibrated on sample face crops
+    # test_emotion_detection(model_path, image_path="analysis/cnn/test_images/sad_test.jpg",
+    #                        render=True, calibration_images=["analysis/cnn/test_images/happy_test.jpg"])
\ No newline at end of file
@@ -0,0 +1,26 @@
+import logging
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler, set_rollback
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def custom_exception_handler(exc, context):
+    """
+    DRF exception handler that answers unhandled exceptions with a generic 500
+    instead of letting them propagate. The traceback is logged rather than
+    returned, so error details never reach the client.
+    """
+    response = exception_handler(exc, context)
+    if response is not None:
+        return response
+
+    view = context.get('view')
+    logger.error(f"Unhandled error in {view.__class__.__name__}", exc_info=exc)
+    set_rollback()
+    return Response(
+        {'error': 'Internal server error'},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR
+    )
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from analysis.cnn.model_loader import representative_dataset
+from analysis.cnn.runtime import BACKENDS, get_infer
+from analysis.utils.emotion_detector import EmotionDetector
+
+
+class Command(BaseCommand):
+    help = 'Compare a quantized emotion model backend against the float32 model on sample face crops'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'backend',
+            choices=[backend for backend in BACKENDS if backend != 'tensorflow'],
+            help='Backend to compare against tensorflow',
+        )
+        parser.add_argument(
+            '--model-path',
+            default=os.path.join(settings.BASE_DIR, 'analysis/cnn/three_emotion_model.h5'),
+            help='Path to the Keras H5 model file',
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model_path']
+        if not os.path.exists(model_path):
+            raise CommandError(f'Model file not found: {model_path}')
+
+        images = EmotionDetector.calibration_images()
+        if not images:
+            raise CommandError(f'No images found in {settings.EMOTION_MODEL_CALIBRATION_DIR}')
+        batch = np.concatenate([sample for sample, in representative_dataset(images)])
+
+        reference = np.asarray(get_infer(model_path)(batch))
+        candidate = np.asarray(get_infer(model_path, options['backend'], images)(batch))
+
+        agreement = (reference.argmax(axis=1) == candidate.argmax(axis=1)).mean()
+        max_error = np.abs(reference - candidate).max()
+        self.stdout.write(
+            f'{options["backend"]} on {len(batch)} images: {agreement:.1%} same dominant emotion, '
+            f'max probability difference {max_error:.4f}'
+        )
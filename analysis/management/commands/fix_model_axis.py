@@ -0,0 +1,26 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from analysis.cnn.model_loader import fix_model_file_axis
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the emotion model H5 config so it loads without a BatchNormalization shim'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'analysis/cnn/three_emotion_model.h5'),
+            help='Path to the Keras H5 model file',
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model_path']
+        if not os.path.exists(model_path):
+            raise CommandError(f'Model file not found: {model_path}')
+
+        if not fix_model_file_axis(model_path):
+            raise CommandError(f'No model_config found in {model_path}')
+
+        self.stdout.write(self.style.SUCCESS(f'Fixed BatchNormalization axes in {model_path}'))
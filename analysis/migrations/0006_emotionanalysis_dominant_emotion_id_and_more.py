@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+def populate_dominant_emotion_id(apps, schema_editor):
+    # Frames written through bulk_create skipped save(), so their dominant_emotion
+    # is blank; derive both fields from the scores, the first highest one winning
+    EmotionAnalysis = apps.get_model('analysis', 'EmotionAnalysis')
+    emotion_names = ('angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprised')
+    conditions = []
+    for index, emotion in enumerate(emotion_names):
+        condition = models.Q()
+        for other_index, other in enumerate(emotion_names):
+            if other_index < index:
+                condition &= models.Q(**{f'{emotion}__gt': models.F(other)})
+            elif other_index > index:
+                condition &= models.Q(**{f'{emotion}__gte': models.F(other)})
+        conditions.append(condition)
+    EmotionAnalysis.objects.update(
+        dominant_emotion_id=models.Case(
+            *(models.When(condition, then=models.Value(index)) for index, condition in enumerate(conditions)),
+            default=models.Value(0),
+            output_field=models.PositiveSmallIntegerField()
+        ),
+        dominant_emotion=models.Case(
+            *(models.When(condition, then=models.Value(emotion)) for emotion, condition in zip(emotion_names, conditions)),
+            default=models.Value(emotion_names[0]),
+            output_field=models.CharField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0005_emotionanalysissummary_emotion_counts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emotionanalysis',
+            name='dominant_emotion_id',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Index of the dominant emotion in EMOTION_NAMES'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionanalysis',
+            index=models.Index(fields=['video', 'timestamp'], name='analysis_em_video_i_c272ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionanalysis',
+            index=models.Index(fields=['video', 'dominant_emotion_id'], name='analysis_em_video_i_a5b768_idx'),
+        ),
+        migrations.RunPython(populate_dominant_emotion_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-16 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0006_emotionanalysis_dominant_emotion_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 digest of the video file', max_length=64),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-16 12:25
+
+from django.db import migrations, models
+
+
+def copy_emotion_counts(apps, schema_editor):
+    EmotionAnalysisSummary = apps.get_model('analysis', 'EmotionAnalysisSummary')
+    summaries = list(EmotionAnalysisSummary.objects.only('id', 'emotion_counts'))
+    for summary in summaries:
+        counts = summary.emotion_counts or {}
+        summary.angry_count = counts.get('angry', 0)
+        summary.sad_count = counts.get('sad', 0)
+        summary.happy_count = counts.get('happy', 0)
+        summary.total_frames = counts.get(
+            'total_frames',
+            sum(value for key, value in counts.items() if key != 'total_frames')
+        )
+    EmotionAnalysisSummary.objects.bulk_update(
+        summaries, ['angry_count', 'sad_count', 'happy_count', 'total_frames'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0007_video_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emotionanalysissummary',
+            name='angry_count',
+            field=models.PositiveIntegerField(default=0, help_text='Frames where anger was dominant'),
+        ),
+        migrations.AddField(
+            model_name='emotionanalysissummary',
+            name='happy_count',
+            field=models.PositiveIntegerField(default=0, help_text='Frames where happiness was dominant'),
+        ),
+        migrations.AddField(
+            model_name='emotionanalysissummary',
+            name='sad_count',
+            field=models.PositiveIntegerField(default=0, help_text='Frames where sadness was dominant'),
+        ),
+        migrations.AddField(
+            model_name='emotionanalysissummary',
+            name='total_frames',
+            field=models.PositiveIntegerField(default=0, help_text='Number of analyzed frames'),
+        ),
+        migrations.RunPython(copy_emotion_counts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='emotionanalysissummary',
+            name='emotion_counts',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-16 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0008_emotionanalysissummary_angry_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emotiontimeline',
+            index=models.Index(fields=['video', 'start_time'], name='analysis_em_video_i_173e4c_idx'),
+        ),
+    ]
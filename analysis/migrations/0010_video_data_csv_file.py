@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-16 14:31
+
+import analysis.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0009_emotiontimeline_analysis_em_video_i_173e4c_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='data_csv_file',
+            field=models.FileField(blank=True, editable=False, help_text='Emotion data CSV written when the analysis completes', upload_to=analysis.models.export_upload_path),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-16 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0010_video_data_csv_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='analysis_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Digest of the file, model and parameters the stored analysis was produced with', max_length=64),
+        ),
+    ]
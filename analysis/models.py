@@ -1,14 +1,25 @@
-import uuid
-import csv
+import hashlib
 import io
-from django.db import models
+import tempfile
+import uuid
+import numpy as np
+from django.core.files import File
+from django.db import connection, models
+from django.utils import timezone
 from residents.models import Resident
 from therapy_sessions.models import TherapySession
 
+# Emotion columns in the order used to derive the dominant emotion
+EMOTION_NAMES = ('angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprised')
+
 def video_upload_path(instance, filename):
     """Generate a unique path for uploaded videos"""
     return f'uploads/videos/{instance.id}/{filename}'
 
+def export_upload_path(instance, filename):
+    """Generate the path of a video's precomputed exports"""
+    return f'exports/videos/{instance.id}/{filename}'
+
 class Video(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -22,6 +33,26 @@ class Video(models.Model):
     description = models.TextField(blank=True)
     file = models.FileField(upload_to=video_upload_path)
     file_size = models.BigIntegerField(default=0, blank=True)
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="SHA-256 digest of the video file"
+    )
+    analysis_key = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="Digest of the file, model and parameters the stored analysis was produced with"
+    )
+    data_csv_file = models.FileField(
+        upload_to=export_upload_path,
+        blank=True,
+        editable=False,
+        help_text="Emotion data CSV written when the analysis completes"
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -45,49 +76,61 @@ class Video(models.Model):
         return self.title
     
     def save(self, *args, **kwargs):
-        if self.file:
-            # Update file_size if file is available
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Only refresh file_size when the caller is explicitly saving the file
+            if self.file and 'file' in update_fields:
+                self.file_size = self.file.size
+                kwargs['update_fields'] = {*update_fields, 'file_size'}
+        elif self.file and (self._state.adding or not self.file._committed or not self.file_size):
+            # Update file_size only for new files, as remote storages stat over the network
             self.file_size = self.file.size
         super().save(*args, **kwargs)
     
+    def compute_sha256(self):
+        """Return the SHA-256 hex digest of the stored file, read in 1 MiB blocks"""
+        digest = hashlib.sha256()
+        with self.file.open('rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
     def get_emotion_data_csv(self):
-        """Generate a CSV file with emotion analysis data"""
-        output = io.StringIO()
-        writer = csv.writer(output)
+        """Yield the emotion analysis data as CSV lines"""
+        yield 'Timestamp,Angry,Sad,Happy,Dominant Emotion\r\n'
         
-        # Write header row
-        writer.writerow(['Timestamp', 'Angry', 'Sad', 'Happy', 'Dominant Emotion'])
+        # Stream individual frame analysis data without instantiating models
+        rows = self.emotion_analyses.order_by('timestamp').values_list(
+            'timestamp', 'angry', 'sad', 'happy', 'dominant_emotion'
+        )
+        for row in rows.iterator(chunk_size=2000):
+            yield '%.2f,%.4f,%.4f,%.4f,%s\r\n' % row
+    
+    def export_emotion_data_csv(self):
+        """
+        Write the emotion data CSV to storage once, so downloads serve the stored
+        file instead of regenerating it. Returns the stored file name.
+        """
+        # Spill to disk past 1 MiB rather than holding a long video's CSV in memory
+        with tempfile.SpooledTemporaryFile(max_size=1 << 20) as buffer:
+            for line in self.get_emotion_data_csv():
+                buffer.write(line.encode())
+            buffer.seek(0)
+            self.data_csv_file.save('emotion_data.csv', File(buffer), save=False)
         
-        # Write individual frame analysis data
-        for analysis in self.emotion_analyses.all().order_by('timestamp'):
-            writer.writerow([
-                f"{analysis.timestamp:.2f}",
-                f"{analysis.angry:.4f}",
-                f"{analysis.sad:.4f}",
-                f"{analysis.happy:.4f}",
-                analysis.dominant_emotion
-            ])
-            
-        return output.getvalue()
+        Video.objects.filter(pk=self.pk).update(data_csv_file=self.data_csv_file.name)
+        return self.data_csv_file.name
     
     def get_emotion_timeline_csv(self):
-        """Generate a CSV file with emotion timeline segments"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header row
-        writer.writerow(['Start Time', 'End Time', 'Duration', 'Dominant Emotion'])
+        """Yield the emotion timeline segments as CSV lines"""
+        yield 'Start Time,End Time,Duration,Dominant Emotion\r\n'
         
-        # Write timeline segments
-        for segment in self.emotion_timeline.all().order_by('start_time'):
-            writer.writerow([
-                f"{segment.start_time:.2f}",
-                f"{segment.end_time:.2f}",
-                f"{segment.duration:.2f}",
-                segment.dominant_emotion
-            ])
-            
-        return output.getvalue()
+        # Stream timeline segments without instantiating models
+        rows = self.emotion_timeline.order_by('start_time').values_list(
+            'start_time', 'end_time', 'duration', 'dominant_emotion'
+        )
+        for row in rows.iterator(chunk_size=2000):
+            yield '%.2f,%.2f,%.2f,%s\r\n' % row
 
 
 class EmotionAnalysis(models.Model):
@@ -102,25 +145,99 @@ class EmotionAnalysis(models.Model):
     sad = models.FloatField(default=0.0)
     surprised = models.FloatField(default=0.0)
     dominant_emotion = models.CharField(max_length=20, blank=True)
+    dominant_emotion_id = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Index of the dominant emotion in EMOTION_NAMES"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['video', 'timestamp']
+        indexes = [
+            models.Index(fields=['video', 'timestamp']),
+            models.Index(fields=['video', 'dominant_emotion_id']),
+        ]
         
     def save(self, *args, **kwargs):
         # Calculate the dominant emotion
-        emotions = {
-            'angry': self.angry,
-            'disgust': self.disgust,
-            'fear': self.fear,
-            'happy': self.happy,
-            'neutral': self.neutral,
-            'sad': self.sad,
-            'surprised': self.surprised
-        }
-        self.dominant_emotion = max(emotions, key=emotions.get)
+        scores = (
+            self.angry, self.disgust, self.fear, self.happy,
+            self.neutral, self.sad, self.surprised
+        )
+        self.dominant_emotion_id = scores.index(max(scores))
+        self.dominant_emotion = EMOTION_NAMES[self.dominant_emotion_id]
         super().save(*args, **kwargs)
 
+    @classmethod
+    def bulk_ingest(cls, video, timestamps, probs, emotions=EMOTION_NAMES, batch_size=1000):
+        """
+        Bulk insert one analysis per frame from N timestamps and an (N, len(emotions))
+        probability array whose columns follow the order of emotions.
+        Rows are built and flushed batch_size at a time, through COPY on Postgres;
+        returns the number inserted.
+        """
+        # Spread the model's columns over every emotion field, leaving the rest at 0.0
+        scores = np.zeros((len(timestamps), len(EMOTION_NAMES)))
+        scores[:, [EMOTION_NAMES.index(emotion) for emotion in emotions]] = probs
+        
+        # bulk_create skips save(), so derive every dominant emotion here in one call
+        dominant_ids = scores.argmax(axis=1)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        
+        # Only one batch of rows is alive at a time
+        for start in range(0, len(timestamps), batch_size):
+            stop = start + batch_size
+            batch = zip(
+                timestamps[start:stop].tolist(),
+                scores[start:stop].tolist(),
+                dominant_ids[start:stop].tolist()
+            )
+            if connection.vendor == 'postgresql':
+                cls._copy_rows(video, batch)
+                continue
+            
+            cls.objects.bulk_create([
+                cls(
+                    video=video,
+                    timestamp=timestamp,
+                    dominant_emotion=EMOTION_NAMES[dominant_id],
+                    dominant_emotion_id=dominant_id,
+                    **dict(zip(EMOTION_NAMES, row))
+                )
+                for timestamp, row, dominant_id in batch
+            ])
+        return len(timestamps)
+
+    @classmethod
+    def _copy_rows(cls, video, rows):
+        """
+        Load (timestamp, scores, dominant_id) rows with one Postgres COPY, skipping
+        model instances and per-row parameter binding. Fills the Python-side
+        defaults (id, created_at) that bulk_create would otherwise supply.
+        """
+        field_names = ('id', 'video', 'timestamp', *EMOTION_NAMES,
+                       'dominant_emotion', 'dominant_emotion_id', 'created_at')
+        columns = ', '.join(
+            connection.ops.quote_name(cls._meta.get_field(name).column) for name in field_names
+        )
+        video_id = str(video.pk)
+        created_at = timezone.now().isoformat()
+        
+        buffer = io.StringIO()
+        for timestamp, row, dominant_id in rows:
+            buffer.write('\t'.join((
+                str(uuid.uuid4()), video_id, repr(timestamp), *map(repr, row),
+                EMOTION_NAMES[dominant_id], str(dominant_id), created_at
+            )))
+            buffer.write('\n')
+        buffer.seek(0)
+        
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {connection.ops.quote_name(cls._meta.db_table)} ({columns}) FROM STDIN",
+                buffer
+            )
+
 
 class EmotionTimeline(models.Model):
     """Model to store emotion timeline segments"""
@@ -135,6 +252,9 @@ class EmotionTimeline(models.Model):
     
     class Meta:
         ordering = ['video', 'start_time']
+        indexes = [
+            models.Index(fields=['video', 'start_time']),
+        ]
         
     def __str__(self):
         return f"{self.video.title}: {self.dominant_emotion} from {self.start_time:.1f}s to {self.end_time:.1f}s"
@@ -151,20 +271,40 @@ class EmotionAnalysisSummary(models.Model):
     sad_avg = models.FloatField(default=0.0)
     surprised_avg = models.FloatField(default=0.0)
     dominant_emotion = models.CharField(max_length=20, blank=True)
-    emotion_counts = models.JSONField(default=dict, help_text="Count of frames for each emotion")
+    angry_count = models.PositiveIntegerField(default=0, help_text="Frames where anger was dominant")
+    sad_count = models.PositiveIntegerField(default=0, help_text="Frames where sadness was dominant")
+    happy_count = models.PositiveIntegerField(default=0, help_text="Frames where happiness was dominant")
+    total_frames = models.PositiveIntegerField(default=0, help_text="Number of analyzed frames")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def rebuild(cls, video):
+        """
+        Recompute the summary for a video from its stored frame analyses, with
+        one aggregate query instead of fetching every frame
+        """
+        counted = ('angry', 'sad', 'happy')
+        aggregates = {f"{emotion}_avg": models.Avg(emotion) for emotion in EMOTION_NAMES}
+        aggregates.update({
+            f"{emotion}_count": models.Count(
+                'pk', filter=models.Q(dominant_emotion_id=EMOTION_NAMES.index(emotion))
+            )
+            for emotion in counted
+        })
+        aggregates['total_frames'] = models.Count('pk')
+        defaults = EmotionAnalysis.objects.filter(video=video).aggregate(**aggregates)
+        if not defaults['total_frames']:
+            return None
+        
+        summary, _ = cls.objects.update_or_create(video=video, defaults=defaults)
+        return summary
+
     def save(self, *args, **kwargs):
         # Calculate the dominant emotion
-        emotions = {
-            'angry': self.angry_avg,
-            'disgust': self.disgust_avg,
-            'fear': self.fear_avg,
-            'happy': self.happy_avg,
-            'neutral': self.neutral_avg,
-            'sad': self.sad_avg,
-            'surprised': self.surprised_avg
-        }
-        self.dominant_emotion = max(emotions, key=emotions.get)
+        averages = (
+            self.angry_avg, self.disgust_avg, self.fear_avg, self.happy_avg,
+            self.neutral_avg, self.sad_avg, self.surprised_avg
+        )
+        self.dominant_emotion = EMOTION_NAMES[averages.index(max(averages))]
         super().save(*args, **kwargs)
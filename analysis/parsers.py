@@ -0,0 +1,112 @@
+import os
+import uuid
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, load_handler
+from rest_framework import parsers
+from .models import Video
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StoredUploadedFile(UploadedFile):
+    """
+    An uploaded video already written to its final place in the video storage.
+    storage_name is the name to assign to Video.file and video_id the primary
+    key its upload path was generated for.
+    """
+    def __init__(self, file, name, content_type, size, charset, storage, storage_name, video_id):
+        super().__init__(file, name, content_type, size, charset)
+        self.storage = storage
+        self.storage_name = storage_name
+        self.video_id = video_id
+        self.committed = False
+
+    def delete(self):
+        """Remove the stored file, for uploads that never became a video"""
+        self.close()
+        self.storage.delete(self.storage_name)
+
+class StreamingVideoUploadHandler(FileUploadHandler):
+    """
+    Write an uploaded video straight to the path Video.file would store it at,
+    instead of spooling it to a temporary file that is then copied into the
+    storage. Large chunks keep the multipart parser's per-chunk overhead low.
+    Only the video field is taken over; any other file field is passed on to
+    the next upload handler.
+    """
+    chunk_size = 4 * 2 ** 20
+    video_field = 'file'
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name == self.video_field
+        if not self.active:
+            return
+        field = Video._meta.get_field(self.video_field)
+        self.storage = field.storage
+        self.video_id = uuid.uuid4()
+        self.storage_name = self.storage.get_available_name(
+            field.generate_filename(Video(id=self.video_id), file_name)
+        )
+        path = self.storage.path(self.storage_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'wb')
+        self.size = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.file.write(raw_data)
+        self.size += len(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        self.file.close()
+        if self.storage.file_permissions_mode is not None:
+            os.chmod(self.storage.path(self.storage_name), self.storage.file_permissions_mode)
+        return StoredUploadedFile(
+            file=self.storage.open(self.storage_name, 'rb'),
+            name=self.file_name,
+            content_type=self.content_type,
+            size=self.size,
+            charset=self.charset,
+            storage=self.storage,
+            storage_name=self.storage_name,
+            video_id=self.video_id
+        )
+
+    def upload_interrupted(self):
+        if getattr(self, 'active', False):
+            self.file.close()
+            try:
+                self.storage.delete(self.storage_name)
+            except OSError:
+                logger.warning(f"Could not remove interrupted upload {self.storage_name}")
+
+class StreamingMultiPartParser(parsers.MultiPartParser):
+    """
+    MultiPartParser that streams the video of a POST, which creates a video,
+    into the video storage. Other file fields, updates and storages without
+    local paths keep Django's default upload handlers.
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']._request
+        try:
+            Video._meta.get_field('file').storage.path('')
+        except NotImplementedError:
+            pass
+        else:
+            if request.method == 'POST':
+                # The parser reads in the smallest handler chunk size, so the default
+                # handlers behind the streaming one are given its larger chunks
+                streaming = StreamingVideoUploadHandler(request)
+                request.upload_handlers = [streaming]
+                for path in settings.FILE_UPLOAD_HANDLERS:
+                    handler = load_handler(path, request)
+                    handler.chunk_size = streaming.chunk_size
+                    request.upload_handlers.append(handler)
+        return super().parse(stream, media_type, parser_context)
@@ -4,6 +4,24 @@ from residents.models import Resident
 from therapy_sessions.models import TherapySession
 from .models import Video, EmotionAnalysis, EmotionAnalysisSummary, EmotionTimeline
 
+# Example summary shared by the summary and video detail schema examples
+_POSITIVE_SESSION_SUMMARY = {
+    "id": 1,
+    "video": "550e8400-e29b-41d4-a716-446655440000",
+    "angry_avg": 0.12,
+    "sad_avg": 0.25,
+    "happy_avg": 0.63,
+    "dominant_emotion": "happy",
+    "emotion_counts": {
+        "happy": 1250,
+        "sad": 480,
+        "angry": 200,
+        "total_frames": 1930
+    },
+    "created_at": "2024-01-15T10:45:00Z",
+    "updated_at": "2024-01-15T10:45:00Z"
+}
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -64,8 +82,16 @@ class VideoSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Video
-        fields = '__all__'
+        fields = [
+            'id', 'title', 'description', 'file', 'file_size', 'status',
+            'uploaded_at', 'updated_at', 'therapy_session', 'resident'
+        ]
         read_only_fields = ['id', 'file_size', 'status', 'uploaded_at', 'updated_at']
+        # Related objects are only validated and stored by key, so fetch just the key
+        extra_kwargs = {
+            'therapy_session': {'queryset': TherapySession.objects.only('pk')},
+            'resident': {'queryset': Resident.objects.only('pk')},
+        }
 
 @extend_schema_serializer(
     examples=[
@@ -113,8 +139,8 @@ class VideoInitSerializer(serializers.Serializer):
     """
     title = serializers.CharField(max_length=255)
     description = serializers.CharField(required=False, allow_blank=True)
-    resident = serializers.PrimaryKeyRelatedField(queryset=Resident.objects.all(), required=False)
-    therapy_session = serializers.PrimaryKeyRelatedField(queryset=TherapySession.objects.all(), required=False)
+    resident = serializers.PrimaryKeyRelatedField(queryset=Resident.objects.only('pk'), required=False)
+    therapy_session = serializers.PrimaryKeyRelatedField(queryset=TherapySession.objects.only('pk'), required=False)
     
 @extend_schema_serializer(
     examples=[
@@ -299,22 +325,7 @@ class EmotionTimelineSerializer(serializers.ModelSerializer):
             summary="Summary of a predominantly positive therapy session",
             description="Overall emotion analysis showing good therapeutic "
                        "response with detailed emotion counts",
-            value={
-                "id": 1,
-                "video": "550e8400-e29b-41d4-a716-446655440000",
-                "angry_avg": 0.12,
-                "sad_avg": 0.25,
-                "happy_avg": 0.63,
-                "dominant_emotion": "happy",
-                "emotion_counts": {
-                    "happy": 1250,
-                    "sad": 480,
-                    "angry": 200,
-                    "total_frames": 1930
-                },
-                "created_at": "2024-01-15T10:45:00Z",
-                "updated_at": "2024-01-15T10:45:00Z"
-            },
+            value=_POSITIVE_SESSION_SUMMARY,
             request_only=False,
             response_only=True,
         ),
@@ -364,7 +375,7 @@ class EmotionAnalysisSummarySerializer(serializers.ModelSerializer):
     - Comparative analysis between patients
     - Therapy optimization insights
     """
-    emotion_counts = serializers.JSONField(required=False)
+    emotion_counts = serializers.SerializerMethodField()
     
     class Meta:
         model = EmotionAnalysisSummary
@@ -373,6 +384,14 @@ class EmotionAnalysisSummarySerializer(serializers.ModelSerializer):
             'dominant_emotion', 'emotion_counts', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'dominant_emotion']
+    
+    def get_emotion_counts(self, obj) -> dict:
+        return {
+            'happy': obj.happy_count,
+            'sad': obj.sad_count,
+            'angry': obj.angry_count,
+            'total_frames': obj.total_frames
+        }
 
 @extend_schema_serializer(
     examples=[
@@ -393,29 +412,14 @@ class EmotionAnalysisSummarySerializer(serializers.ModelSerializer):
                 "status": "completed",
                 "therapy_session": 1,
                 "resident": 1,
-                "emotion_summary": {
-                    "id": 1,
-                    "video": "550e8400-e29b-41d4-a716-446655440000",
-                    "angry_avg": 0.12,
-                    "sad_avg": 0.25,
-                    "happy_avg": 0.63,
-                    "dominant_emotion": "happy",
-                    "emotion_counts": {
-                        "happy": 1250,
-                        "sad": 480,
-                        "angry": 200,
-                        "total_frames": 1930
-                    },
-                    "created_at": "2024-01-15T10:45:00Z",
-                    "updated_at": "2024-01-15T10:45:00Z"
-                }
+                "emotion_summary": _POSITIVE_SESSION_SUMMARY
             },
             request_only=False,
             response_only=True,
         )
     ]
 )
-class VideoDetailSerializer(serializers.ModelSerializer):
+class VideoDetailSerializer(VideoSerializer):
     """
     Detailed video serializer with comprehensive emotion analysis.
     
@@ -437,11 +441,10 @@ class VideoDetailSerializer(serializers.ModelSerializer):
     """
     emotion_summary = EmotionAnalysisSummarySerializer(read_only=True)
     
-    class Meta:
-        model = Video
-        fields = [
-            'id', 'title', 'description', 'file', 'file_size', 
-            'uploaded_at', 'updated_at', 'status', 'therapy_session',
-            'resident', 'emotion_summary'
-        ]
-        read_only_fields = ['id', 'file_size', 'uploaded_at', 'updated_at', 'status']
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['emotion_summary']
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Join the embedded summary so each video is serialized from one query"""
+        return queryset.select_related('emotion_summary')
@@ -0,0 +1,17 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Video
+
+# Version folded into every cached video list count; bumping it retires them all
+VIDEO_COUNT_VERSION_KEY = 'video_count_version'
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def clear_video_count_cache(sender, instance, **kwargs):
+    # Any saved field may be filtered or searched on, so every write can change a count
+    try:
+        cache.incr(VIDEO_COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(VIDEO_COUNT_VERSION_KEY, 1, None)
@@ -1,7 +1,15 @@
+import functools
+import hashlib
+import itertools
 import os
+import threading
+from operator import itemgetter
 import numpy as np
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from celery import shared_task
+from celery.signals import worker_process_init
 from .models import Video, EmotionAnalysis, EmotionAnalysisSummary, EmotionTimeline
 from .utils.emotion_detector import EmotionDetector
 import logging
@@ -9,231 +17,261 @@ import logging
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Emotions produced by the three-emotion model, in model output order
+SUPPORTED_EMOTIONS = ('angry', 'sad', 'happy')
+_get_scores = itemgetter(*SUPPORTED_EMOTIONS)
+
+# One detector per worker process, so the model is loaded once and reused by every task
+_detector = None
+_detector_lock = threading.Lock()
+
+def _get_detector():
+    """Return this process's EmotionDetector, creating it on first use"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = EmotionDetector()
+    return _detector
+
+def _set_status(video_id, status, current='processing', **fields):
+    """
+    Move a video from the current status to status with a single-row UPDATE,
+    bumping updated_at as save() would and writing any other given fields.
+    Returns False when the video is no longer in the current status, e.g. a
+    reanalysis reset it to pending.
+    """
+    return bool(Video.objects.filter(pk=video_id, status=current).update(
+        status=status, updated_at=timezone.now(), **fields
+    ))
+
+@functools.lru_cache(maxsize=8)
+def _model_digest(model_path, size, mtime_ns):
+    """SHA-256 of a model file, memoized per file version"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _analysis_key(digest, model_path, frame_rate, similarity_threshold):
+    """
+    Key the results of analyzing a file by everything that shapes its scores:
+    the file digest, the model file, the inference settings and the task
+    parameters. Only videos with equal keys can share their analysis.
+    """
+    try:
+        model_stat = os.stat(model_path)
+        model_version = _model_digest(model_path, model_stat.st_size, model_stat.st_mtime_ns)
+    except OSError:
+        model_version = model_path
+    parts = (
+        digest, model_version, settings.EMOTION_MODEL_BACKEND, settings.EMOTION_DETECT_FACES,
+        float(frame_rate), float(similarity_threshold)
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+@worker_process_init.connect
+def _warm_detector(**kwargs):
+    """
+    Load the emotion model as each analysis worker process starts, before its
+    first task. Workers not consuming EMOTION_ANALYSIS_QUEUE never run the model
+    and skip it; _get_detector() still loads it lazily should one ever need it.
+    """
+    if settings.EMOTION_ANALYSIS_QUEUE not in analyze_video_emotions.app.amqp.queues.consume_from:
+        return
+    _get_detector().load_model()
+
 @shared_task
-def analyze_video_emotions(video_id, frame_rate=1.0):
+def analyze_video_emotions(video_id, frame_rate=1.0, similarity_threshold=5.0, reuse_duplicates=True):
     """
     Process video and detect emotions in each frame, then build emotion timeline
     Args:
         video_id: UUID of the video to process
         frame_rate: Number of frames per second to analyze
+        similarity_threshold: Mean pixel difference below which a frame reuses the
+            previous inference (see EmotionDetector.analyze_video); 0 disables reuse
+        reuse_duplicates: Copy the results of a completed video analyzed from the
+            same file with the same model and parameters instead of running the
+            model; reanalysis turns this off
     """
     try:
-        # Get video instance
-        video = Video.objects.get(id=video_id)
-        
-        # Update status to processing
-        video.status = 'processing'
-        video.save()
+        # Claim the pending video and mark it processing in one transaction, so a
+        # duplicate or retried delivery of this task does not analyze it twice
+        with transaction.atomic():
+            video = Video.objects.select_for_update(skip_locked=True).filter(
+                pk=video_id, status='pending'
+            ).first()
+            if video is None:
+                logger.info(f"Video {video_id} does not exist, is not pending or is already claimed")
+                return False
+            _set_status(video_id, 'processing', current='pending')
         
-        # Initialize emotion detector
-        detector = EmotionDetector()
+        # Reuse the worker's already loaded emotion detector
+        detector = _get_detector()
         video_path = os.path.join(settings.MEDIA_ROOT, video.file.name)
         
-        if not os.path.exists(video_path):
+        try:
+            video_stat = os.stat(video_path)
+        except FileNotFoundError:
             logger.error(f"Video file not found at path: {video_path}")
-            video.status = 'failed'
-            video.save()
+            _set_status(video_id, 'failed')
             return False
+        logger.info(f"Analyzing {video_path} ({video_stat.st_size} bytes)")
+        
+        # Record the file digest so duplicate uploads can be recognised
+        digest = video.sha256
+        if not digest:
+            digest = video.compute_sha256()
+            Video.objects.filter(pk=video_id).update(sha256=digest)
         
-        # Analyze video
-        logger.info(f"Starting emotion analysis for video {video_id}")
-        results = detector.analyze_video(video_path, frame_rate)
+        # Keep only each frame's timestamp and scores in model output order
+        timestamps = []
+        rows = []
         
-        if not results:
+        analysis_key = _analysis_key(digest, detector.model_path, frame_rate, similarity_threshold)
+        duplicate = None
+        if reuse_duplicates:
+            duplicate = Video.objects.filter(
+                analysis_key=analysis_key, status='completed'
+            ).exclude(pk=video_id).first()
+        if duplicate is not None:
+            # Identical file already analyzed: reuse its frame scores instead of running the model
+            logger.info(f"Reusing emotion analysis of video {duplicate.pk} for identical video {video_id}")
+            frames = duplicate.emotion_analyses.order_by('timestamp').values_list(
+                'timestamp', 'angry', 'sad', 'happy'
+            )
+            for timestamp, angry, sad, happy in frames.iterator(chunk_size=2000):
+                timestamps.append(timestamp)
+                rows.append((angry, sad, happy))
+        else:
+            # Analyze video; every frame carries the same keys, so only the first is validated
+            logger.info(f"Starting emotion analysis for video {video_id}")
+            results = iter(detector.analyze_video_parallel(
+                video_path, frame_rate, similarity_threshold, settings.EMOTION_MAX_WORKERS
+            ))
+            first = next(results, None)
+            if first is not None:
+                missing = set(SUPPORTED_EMOTIONS) - first.keys()
+                if missing:
+                    logger.error(f"Missing {sorted(missing)} in frame results for video {video_id}")
+                    _set_status(video_id, 'failed')
+                    return False
+            try:
+                for result in itertools.chain((first,) if first is not None else (), results):
+                    timestamps.append(result['timestamp'])
+                    rows.append(_get_scores(result))
+            except KeyError as e:
+                logger.error(f"Missing {e} in frame results for video {video_id}")
+                _set_status(video_id, 'failed')
+                return False
+        
+        if not rows:
             logger.error(f"No analysis results returned for video {video_id}")
-            video.status = 'failed'
-            video.save()
+            _set_status(video_id, 'failed')
             return False
-            
-        # Store individual frame results
-        emotion_analyses = []
-        
-        # Define supported emotions for the new model
-        supported_emotions = ['angry', 'sad', 'happy']
         
-        # Initialize emotion sums and counts dictionaries with only supported emotions
-        emotion_sums = {emotion: 0.0 for emotion in supported_emotions}
-        emotion_counts = {emotion: 0 for emotion in supported_emotions}
+        # Stack the frame scores into one (N, 3) array and derive each frame's
+        # dominant emotion index once for every later stage
+        scores = np.array(rows, dtype=np.float32)
+        dominant = scores.argmax(axis=1)
         
-        # Process each frame result
-        for result in results:
-            timestamp = result['timestamp']
-            
-            # Verify all required emotions are present in the result
-            for emotion in supported_emotions:
-                if emotion not in result:
-                    logger.error(f"Missing emotion '{emotion}' in frame results. Got: {list(result.keys())}")
-                    video.status = 'failed'
-                    video.save()
-                    return False
-            
-            # Create analysis object with only the emotions our model supports
-            analysis_data = {
-                'video': video,
-                'timestamp': timestamp
-            }
+        # Write every result and the final status in one transaction, so a
+        # failure part way through never leaves partial analysis behind
+        with transaction.atomic():
+            # Complete the video first, which also locks its row, and only while
+            # this run still owns it; a reanalysis started meanwhile reset it to
+            # pending and its own task will write fresh results
+            if not _set_status(video_id, 'completed', analysis_key=analysis_key):
+                logger.info(f"Video {video_id} was reset during analysis, discarding results")
+                return False
             
-            # Find dominant emotion for this frame
-            max_emotion = None
-            max_value = -1
+            # Store individual frame results in bounded batches
+            EmotionAnalysis.bulk_ingest(video, timestamps, scores, SUPPORTED_EMOTIONS)
             
-            # Add only the emotions from our new model
-            for emotion in supported_emotions:
-                analysis_data[emotion] = result[emotion]
-                emotion_sums[emotion] += result[emotion]
-                
-                # Track the dominant emotion for this frame
-                if result[emotion] > max_value:
-                    max_value = result[emotion]
-                    max_emotion = emotion
-            
-            if max_emotion:
-                emotion_counts[max_emotion] += 1
+            # Create emotion timeline segments
+            create_emotion_timeline(video, timestamps, scores, dominant)
             
-            # Create EmotionAnalysis instance
-            analysis = EmotionAnalysis(**analysis_data)
-            emotion_analyses.append(analysis)
+            # Aggregate the stored frames into the summary with one query
+            EmotionAnalysisSummary.rebuild(video)
         
-        # Bulk create all emotion analyses
-        EmotionAnalysis.objects.bulk_create(emotion_analyses)
+        logger.info(f"Completed emotion analysis for video {video_id}")
         
-        # Calculate averages and create summary
-        num_frames = len(results)
-        if num_frames > 0:
-            # Create emotion timeline segments
-            create_emotion_timeline(video, emotion_analyses)
-            
-            # Calculate averages for summary
-            emotion_avgs = {emotion: (emotion_sums[emotion] / num_frames) for emotion in supported_emotions}
-            
-            # Create summary object with only supported emotions
-            summary_data = {
-                'video': video,
-                'emotion_counts': emotion_counts
-            }
-            
-            # Add averages for supported emotions only
-            for emotion in supported_emotions:
-                summary_data[f"{emotion}_avg"] = emotion_avgs[emotion]
-                
-            # For compatibility with database model, set other emotions to 0.0 if they exist in the model
-            # This prevents database errors if your model still has these fields
-            other_emotions = ['disgust', 'fear', 'neutral', 'surprised']
-            for emotion in other_emotions:
-                field_name = f"{emotion}_avg"
-                # Check if the field exists in the model
-                if hasattr(EmotionAnalysisSummary, field_name):
-                    summary_data[field_name] = 0.0
-            
-            # Create or update summary
-            summary, created = EmotionAnalysisSummary.objects.update_or_create(
-                video=video,
-                defaults=summary_data
-            )
-            
-            # Update video status to completed
-            video.status = 'completed'
-            video.save()
-            
-            logger.info(f"Completed emotion analysis for video {video_id}")
-            return True
-        else:
-            logger.error(f"No frames processed for video {video_id}")
-            video.status = 'failed'
-            video.save()
-            return False
-            
-    except Video.DoesNotExist:
-        logger.error(f"Video with id {video_id} does not exist")
-        return False
-    except KeyError as e:
-        logger.error(f"Key error processing emotions: {str(e)}")
+        # Precompute the CSV export so downloads serve a stored file; the
+        # download falls back to generating it if this fails
         try:
-            video = Video.objects.get(id=video_id)
-            video.status = 'failed'
-            video.save()
-        except Exception as inner_e:
-            logger.error(f"Could not update video status after KeyError: {str(inner_e)}")
-        return False
-    except Exception as e:
-        logger.error(f"Error analyzing video: {str(e)}", exc_info=True)
+            video.export_emotion_data_csv()
+        except Exception:
+            logger.exception(f"Could not export emotion data CSV for video {video_id}")
+        return True
+            
+    except Exception:
+        logger.exception(f"Error analyzing video {video_id}")
         try:
-            video = Video.objects.get(id=video_id)
-            video.status = 'failed'
-            video.save()
-        except Exception as inner_e:
-            logger.error(f"Could not update video status after error: {str(inner_e)}")
+            _set_status(video_id, 'failed')
+        except Exception:
+            logger.exception("Could not update video status after error")
         return False
 
 
-def create_emotion_timeline(video, analyses):
+def create_emotion_timeline(video, timestamps, scores, dominant=None):
     """
     Create emotion timeline segments from individual frame analyses
     Args:
         video: Video object
-        analyses: List of EmotionAnalysis objects
+        timestamps: Frame timestamps in seconds
+        scores: (N, 3) array of frame scores in SUPPORTED_EMOTIONS order
+        dominant: Optional precomputed scores.argmax(axis=1)
     """
-    if not analyses:
+    if not len(timestamps):
         return
     
-    # Sort analyses by timestamp
-    sorted_analyses = sorted(analyses, key=lambda x: x.timestamp)
+    scores = np.asarray(scores)
+    if dominant is None:
+        dominant = scores.argmax(axis=1)
     
-    current_emotion = None
-    segment_start = 0
-    segment_frames = []
-    emotion_segments = []
+    # Frames arrive in timestamp order from the detector; only sort if they do not
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if (np.diff(timestamps) < 0).any():
+        order = np.argsort(timestamps, kind='stable')
+        scores = scores[order]
+        dominant = np.asarray(dominant)[order]
+        timestamps = timestamps[order]
+    timestamps = timestamps.tolist()
     
-    # Process each analysis to find continuous emotion segments
-    for i, analysis in enumerate(sorted_analyses):
-        # Calculate dominant emotion for this frame
-        emotions = {
-            'angry': analysis.angry,
-            'sad': analysis.sad,
-            'happy': analysis.happy
-        }
-        dominant_emotion = max(emotions, key=emotions.get)
-        confidence = emotions[dominant_emotion]
-        
-        # If this is the first frame or emotion changed
-        if current_emotion is None or current_emotion != dominant_emotion:
-            # If not the first frame, create a segment for the previous emotion
-            if current_emotion is not None:
-                end_time = analysis.timestamp
-                
-                # Create the emotion segment
-                segment = EmotionTimeline(
-                    video=video,
-                    start_time=segment_start,
-                    end_time=end_time,
-                    duration=end_time - segment_start,
-                    dominant_emotion=current_emotion,
-                    confidence=sum(score for _, score in segment_frames) / len(segment_frames) if segment_frames else 0.0
-                )
-                emotion_segments.append(segment)
-            
-            # Start new segment
-            current_emotion = dominant_emotion
-            segment_start = analysis.timestamp
-            segment_frames = [(dominant_emotion, confidence)]
-        else:
-            # Continue current segment
-            segment_frames.append((dominant_emotion, confidence))
+    # Pick each frame's confidence in its dominant emotion in one pass
+    confidences = scores[np.arange(len(scores)), dominant]
     
-    # Add the last segment
-    if current_emotion is not None and sorted_analyses:
-        last_analysis = sorted_analyses[-1]
-        
-        segment = EmotionTimeline(
+    emotion_segments = []
+    for start, end, label, confidence in _segment_runs(dominant, confidences):
+        # A segment ends where the next one starts, or at the last frame
+        end_time = timestamps[end] if end < len(timestamps) else timestamps[-1]
+        emotion_segments.append(EmotionTimeline(
             video=video,
-            start_time=segment_start,
-            end_time=last_analysis.timestamp,
-            duration=last_analysis.timestamp - segment_start,
-            dominant_emotion=current_emotion,
-            confidence=sum(score for _, score in segment_frames) / len(segment_frames) if segment_frames else 0.0
-        )
-        emotion_segments.append(segment)
+            start_time=timestamps[start],
+            end_time=end_time,
+            duration=end_time - timestamps[start],
+            dominant_emotion=SUPPORTED_EMOTIONS[label],
+            confidence=confidence
+        ))
     
     # Bulk create all emotion timeline segments
     if emotion_segments:
-        EmotionTimeline.objects.bulk_create(emotion_segments)
\ No newline at end of file
+        EmotionTimeline.objects.bulk_create(emotion_segments)
+
+
+def _segment_runs(dominant, confidences):
+    """
+    Run-length encode per-frame dominant emotion indices into
+    (start_index, end_index, label, mean_confidence) runs with NumPy.
+    end_index is exclusive.
+    """
+    dominant = np.asarray(dominant)
+    if not len(dominant):
+        return []
+    
+    # A run starts at the first frame and wherever the label changes
+    starts = np.r_[0, np.flatnonzero(np.diff(dominant)) + 1]
+    ends = np.r_[starts[1:], len(dominant)]
+    means = np.add.reduceat(np.asarray(confidences, dtype=np.float64), starts) / (ends - starts)
+    return list(zip(starts.tolist(), ends.tolist(), dominant[starts].tolist(), means.tolist()))
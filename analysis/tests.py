@@ -1,24 +1,46 @@
+import datetime
+import hashlib
+import io
 import os
 import tempfile
-from django.test import TestCase
+import numpy as np
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from authentication.models import User
-from carehomes.models import CareHome
+from rest_framework.exceptions import NotFound
+from carehome_managers.models import CarehomeManagers
+from carehomes.models import CareHomes
 from residents.models import Resident
-from .models import Video
-from .serializers import VideoSerializer
+from therapy_sessions.models import TherapySession
+from .cnn.runtime import _pad_batches
+from .exceptions import custom_exception_handler
+from .models import EmotionAnalysis, EmotionAnalysisSummary, EmotionTimeline, Video
+from .tasks import _analysis_key, _segment_runs, _warm_detector, analyze_video_emotions, create_emotion_timeline
+from .utils.emotion_detector import EmotionDetector
+from .views import REANALYSIS_PRIORITY
+from .signals import VIDEO_COUNT_VERSION_KEY
 
 class VideoModelTests(TestCase):
     """Tests for the Video model."""
     
     def setUp(self):
-        # Create test resident
+        # Create test resident in a care home without an admin
+        care_home = CareHomes.objects.create(name="Test Care Home", address="123 Test Street")
         self.resident = Resident.objects.create(
-            first_name="Test",
-            last_name="Resident"
+            name="Test Resident",
+            date_of_birth=datetime.date(1950, 1, 1),
+            care_home=care_home
         )
         
         # Create a temporary file for testing
@@ -37,6 +59,8 @@ class VideoModelTests(TestCase):
             ),
             resident=self.resident
         )
+        # Tests may replace the file, so remove the original upload too
+        self.addCleanup(self.video.file.storage.delete, self.video.file.name)
     
     def tearDown(self):
         # Close the temporary file
@@ -76,53 +100,129 @@ class VideoModelTests(TestCase):
         
         # File size should be updated
         self.assertGreater(self.video.file_size, original_size)
+    
+    def test_status_update_skips_file_size_lookup(self):
+        """Test that saving only the status does not stat the stored file."""
+        original_size = self.video.file_size
+        
+        with mock.patch.object(type(self.video.file), 'size', new_callable=mock.PropertyMock) as size:
+            self.video.status = 'processing'
+            self.video.save(update_fields=['status'])
+            size.assert_not_called()
+        
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'processing')
+        self.assertEqual(self.video.file_size, original_size)
+    
+    def test_compute_sha256(self):
+        """Test that the file digest matches hashing the uploaded content."""
+        self.assertEqual(
+            self.video.compute_sha256(),
+            hashlib.sha256(b'test video content').hexdigest()
+        )
+    
+    def test_bulk_ingest_sets_dominant_emotion(self):
+        """Test that bulk ingested analyses get the same dominant emotion as save()."""
+        EmotionAnalysis.bulk_ingest(
+            self.video,
+            [0.0, 1.0],
+            [[0.7, 0.2, 0.1], [0.1, 0.3, 0.6]],
+            ('angry', 'sad', 'happy')
+        )
+        
+        analyses = list(self.video.emotion_analyses.order_by('timestamp'))
+        self.assertEqual([a.dominant_emotion for a in analyses], ['angry', 'happy'])
+        self.assertEqual(analyses[1].dominant_emotion_id, 3)
+        self.assertAlmostEqual(analyses[1].sad, 0.3)
+        self.assertEqual(analyses[1].neutral, 0.0)
+    
+    def test_rebuild_summary_aggregates_frames(self):
+        """Test that the rebuilt summary averages and counts the stored frames."""
+        EmotionAnalysis.bulk_ingest(
+            self.video,
+            [0.0, 1.0, 2.0],
+            [[0.7, 0.2, 0.1], [0.1, 0.3, 0.6], [0.1, 0.1, 0.8]],
+            ('angry', 'sad', 'happy')
+        )
+        
+        summary = EmotionAnalysisSummary.rebuild(self.video)
+        self.assertEqual(summary.total_frames, 3)
+        self.assertEqual((summary.angry_count, summary.sad_count, summary.happy_count), (1, 0, 2))
+        self.assertAlmostEqual(summary.happy_avg, 0.5)
+        self.assertEqual(summary.dominant_emotion, 'happy')
+    
+    def test_export_emotion_data_csv(self):
+        """Test that the exported CSV matches the generated one and is recorded on the video."""
+        EmotionAnalysis.bulk_ingest(self.video, [0.0], [[0.7, 0.2, 0.1]], ('angry', 'sad', 'happy'))
+        
+        name = self.video.export_emotion_data_csv()
+        self.addCleanup(self.video.data_csv_file.storage.delete, name)
+        
+        with self.video.data_csv_file.open('rb') as f:
+            self.assertEqual(f.read().decode(), ''.join(self.video.get_emotion_data_csv()))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.data_csv_file.name, name)
+    
+    def test_video_writes_invalidate_list_counts(self):
+        """Test that saving or deleting a video starts new cached list counts."""
+        version = cache.get(VIDEO_COUNT_VERSION_KEY, 0)
+        
+        self.video.title = 'Renamed Video'
+        self.video.save(update_fields=['title'])
+        saved_version = cache.get(VIDEO_COUNT_VERSION_KEY, 0)
+        self.assertNotEqual(saved_version, version)
+        
+        self.video.delete()
+        self.assertNotEqual(cache.get(VIDEO_COUNT_VERSION_KEY, 0), saved_version)
 
 
 class VideoAPITests(APITestCase):
     """Tests for the Video API endpoints."""
     
     def setUp(self):
-        # Create test users with different roles
-        self.superadmin = User.objects.create_user(
+        # Create the role groups with their permissions, then one user per role
+        call_command('init_groups', stdout=io.StringIO())
+        User = get_user_model()
+        self.superadmin = User.objects.create_superadmin(
             email='superadmin@example.com',
-            password='password123',
-            is_superadmin=True
+            name='Super Admin',
+            password='password123'
         )
         
-        self.admin_user = User.objects.create_user(
+        self.admin_user = User.objects.create_admin(
             email='admin@example.com',
+            name='Test Admin',
             password='password123',
-            is_admin=True
+            created_by=self.superadmin
         )
         
-        self.manager_user = User.objects.create_user(
+        self.manager_user = User.objects.create_manager(
             email='manager@example.com',
+            name='Test Manager',
             password='password123',
-            is_manager=True
-        )
-        
-        self.regular_user = User.objects.create_user(
-            email='user@example.com',
-            password='password123'
+            created_by=self.admin_user
         )
         
         # Create care home
-        self.care_home = CareHome.objects.create(
+        self.care_home = CareHomes.objects.create(
             name="Test Care Home",
             address="123 Test Street",
             admin=self.admin_user
         )
         
-        # Associate manager with care home (simplified - actual implementation may vary)
-        if hasattr(self.care_home, 'carehomemanagers'):
-            self.care_home.carehomemanagers.manager = self.manager_user
-            self.care_home.carehomemanagers.save()
+        # Associate manager with care home
+        CarehomeManagers.objects.create(manager=self.manager_user, carehome=self.care_home)
         
-        # Create resident
+        # Create resident and the session the video was recorded in
         self.resident = Resident.objects.create(
-            first_name="Test",
-            last_name="Resident",
-            care_home=self.care_home
+            name="Test Resident",
+            date_of_birth=datetime.date(1950, 1, 1),
+            care_home=self.care_home,
+            created_by=self.admin_user
+        )
+        self.therapy_session = TherapySession.objects.create(
+            resident=self.resident,
+            scheduled_date=timezone.now()
         )
         
         # Create a test video
@@ -134,15 +234,16 @@ class VideoAPITests(APITestCase):
                 content=b'test video content',
                 content_type='video/mp4'
             ),
-            resident=self.resident
+            resident=self.resident,
+            therapy_session=self.therapy_session
         )
         
         # Set up API client
         self.client = APIClient()
         
         # API endpoints
-        self.list_url = reverse('video-list')
-        self.detail_url = reverse('video-detail', kwargs={'pk': self.video.id})
+        self.list_url = reverse('videos-list')
+        self.detail_url = reverse('videos-detail', kwargs={'pk': self.video.id})
     
     def tearDown(self):
         # Clean up any uploaded files
@@ -160,7 +261,7 @@ class VideoAPITests(APITestCase):
         response = self.client.get(self.list_url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Should see the one video created
+        self.assertEqual(response.data['count'], 1)  # Should see the one video created
     
     def test_list_videos_admin(self):
         """Test that admins can only see videos from their care home."""
@@ -168,25 +269,31 @@ class VideoAPITests(APITestCase):
         response = self.client.get(self.list_url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Should see the one video created
+        self.assertEqual(response.data['count'], 1)  # Should see the one video created
         
         # Create a video for a different care home
-        other_admin = User.objects.create_user(
+        other_admin = get_user_model().objects.create_admin(
             email='other_admin@example.com',
+            name='Other Admin',
             password='password123',
-            is_admin=True
+            created_by=self.superadmin
         )
         
-        other_care_home = CareHome.objects.create(
+        other_care_home = CareHomes.objects.create(
             name="Other Care Home",
             address="456 Other Street",
             admin=other_admin
         )
         
         other_resident = Resident.objects.create(
-            first_name="Other",
-            last_name="Resident",
-            care_home=other_care_home
+            name="Other Resident",
+            date_of_birth=datetime.date(1950, 1, 1),
+            care_home=other_care_home,
+            created_by=other_admin
+        )
+        other_session = TherapySession.objects.create(
+            resident=other_resident,
+            scheduled_date=timezone.now()
         )
         
         other_video = Video.objects.create(
@@ -197,13 +304,14 @@ class VideoAPITests(APITestCase):
                 content=b'other test video content',
                 content_type='video/mp4'
             ),
-            resident=other_resident
+            resident=other_resident,
+            therapy_session=other_session
         )
         
         # Admin should still only see their own videos
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data['count'], 1)
         
         # Clean up
         if other_video.file and os.path.isfile(other_video.file.path):
@@ -256,9 +364,48 @@ class VideoAPITests(APITestCase):
         if new_video.file and os.path.isfile(new_video.file.path):
             os.remove(new_video.file.path)
     
+    def test_create_video_streams_file_to_upload_path(self):
+        """Test that an uploaded video is written once, at its own upload path."""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        data = {
+            'title': 'Streamed Test Video',
+            'file': SimpleUploadedFile("streamed.mp4", b"streamed video content", content_type="video/mp4"),
+        }
+        response = self.client.post(self.list_url, data=data, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new_video = Video.objects.get(title='Streamed Test Video')
+        self.assertTrue(new_video.file.name.startswith(f'uploads/videos/{new_video.id}/'))
+        self.assertEqual(new_video.file_size, len(b"streamed video content"))
+        
+        # Clean up
+        os.remove(new_video.file.path)
+    
+    def test_create_video_leaves_other_file_fields_out_of_storage(self):
+        """Test that only the video field is streamed into the video storage."""
+        self.client.force_authenticate(user=self.admin_user)
+        videos_root = Video._meta.get_field('file').storage.path('uploads/videos')
+        os.makedirs(videos_root, exist_ok=True)
+        before = set(os.listdir(videos_root))
+        
+        data = {
+            'title': 'Video With Extra File',
+            'file': SimpleUploadedFile("video.mp4", b"video content", content_type="video/mp4"),
+            'thumbnail': SimpleUploadedFile("thumb.jpg", b"thumbnail content", content_type="image/jpeg"),
+        }
+        response = self.client.post(self.list_url, data=data, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new_video = Video.objects.get(title='Video With Extra File')
+        self.addCleanup(os.remove, new_video.file.path)
+        self.assertEqual(set(os.listdir(videos_root)) - before, {str(new_video.id)})
+        self.assertEqual(os.listdir(os.path.dirname(new_video.file.path)), [os.path.basename(new_video.file.path)])
+    
     def test_update_video(self):
         """Test updating a video."""
-        self.client.force_authenticate(user=self.admin_user)
+        # Only superadmins may change or delete videos
+        self.client.force_authenticate(user=self.superadmin)
         
         data = {
             'title': 'Updated Test Video',
@@ -273,7 +420,8 @@ class VideoAPITests(APITestCase):
     
     def test_delete_video(self):
         """Test deleting a video."""
-        self.client.force_authenticate(user=self.admin_user)
+        # Only superadmins may change or delete videos
+        self.client.force_authenticate(user=self.superadmin)
         
         response = self.client.delete(self.detail_url)
         
@@ -293,19 +441,20 @@ class VideoAPITests(APITestCase):
                 content=b'another test video content',
                 content_type='video/mp4'
             ),
-            resident=self.resident
+            resident=self.resident,
+            therapy_session=self.therapy_session
         )
         
         # Search by title
         response = self.client.get(f"{self.list_url}?search=Another")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['title'], "Another Video")
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['title'], "Another Video")
         
         # Search by description
         response = self.client.get(f"{self.list_url}?search=test")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data['count'], 2)
         
         # Clean up
         if another_video.file and os.path.isfile(another_video.file.path):
@@ -324,21 +473,318 @@ class VideoAPITests(APITestCase):
                 content=b'another test video content',
                 content_type='video/mp4'
             ),
-            resident=self.resident
+            resident=self.resident,
+            therapy_session=self.therapy_session
         )
         
         # Order by title ascending
         response = self.client.get(f"{self.list_url}?ordering=title")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['title'], "Another Video")
-        self.assertEqual(response.data[1]['title'], "Test Video")
+        self.assertEqual(response.data['results'][0]['title'], "Another Video")
+        self.assertEqual(response.data['results'][1]['title'], "Test Video")
         
         # Order by title descending
         response = self.client.get(f"{self.list_url}?ordering=-title")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['title'], "Test Video")
-        self.assertEqual(response.data[1]['title'], "Another Video")
+        self.assertEqual(response.data['results'][0]['title'], "Test Video")
+        self.assertEqual(response.data['results'][1]['title'], "Another Video")
         
         # Clean up
         if another_video.file and os.path.isfile(another_video.file.path):
             os.remove(another_video.file.path)
+
+
+class EmotionTimelineSegmentationTests(SimpleTestCase):
+    """Tests for collapsing per-frame dominant emotions into timeline runs."""
+    
+    def test_segment_runs(self):
+        """Test that consecutive equal emotions are merged with their mean confidence."""
+        runs = _segment_runs([2, 2, 1, 1, 1, 2], [0.8, 0.6, 0.5, 0.7, 0.9, 0.4])
+        
+        self.assertEqual([run[:3] for run in runs], [(0, 2, 2), (2, 5, 1), (5, 6, 2)])
+        self.assertAlmostEqual(runs[0][3], 0.7)
+        self.assertAlmostEqual(runs[1][3], 0.7)
+        self.assertAlmostEqual(runs[2][3], 0.4)
+    
+    def test_segment_runs_empty(self):
+        """Test that no runs are produced without frames."""
+        self.assertEqual(_segment_runs([], []), [])
+
+
+class ExceptionHandlerTests(SimpleTestCase):
+    """Tests for the project-wide DRF exception handler."""
+    
+    def test_unhandled_exception_returns_generic_error(self):
+        """Test that unhandled exceptions become a 500 without leaking their message."""
+        with self.assertLogs('analysis.exceptions', level='ERROR'):
+            response = custom_exception_handler(ValueError('database password'), {'view': None})
+        
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn('database password', str(response.data))
+    
+    def test_api_exceptions_use_default_handling(self):
+        """Test that DRF's own exceptions keep their status and detail."""
+        response = custom_exception_handler(NotFound('No such video'), {'view': None})
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['detail'], 'No such video')
+
+
+class DominantEmotionBackfillMigrationTests(TransactionTestCase):
+    """Tests for the dominant_emotion_id backfill in migration 0006."""
+    
+    migrate_from = [('analysis', '0005_emotionanalysissummary_emotion_counts_and_more')]
+    migrate_to = [('analysis', '0006_emotionanalysis_dominant_emotion_id_and_more')]
+    
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+        self.addCleanup(self.migrate_to_latest)
+    
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+    
+    def test_backfill_derives_dominant_emotion_from_scores(self):
+        """Test that frames bulk created with a blank dominant_emotion get it from their scores."""
+        OldVideo = self.apps.get_model('analysis', 'Video')
+        OldEmotionAnalysis = self.apps.get_model('analysis', 'EmotionAnalysis')
+        video = OldVideo.objects.create(title="Old Video", file='uploads/videos/old.mp4')
+        OldEmotionAnalysis.objects.bulk_create([
+            OldEmotionAnalysis(video=video, timestamp=0.0, angry=0.1, sad=0.2, happy=0.7),
+            OldEmotionAnalysis(video=video, timestamp=1.0, angry=0.2, sad=0.6, happy=0.2),
+            OldEmotionAnalysis(video=video, timestamp=2.0, angry=0.5, sad=0.5, happy=0.0),
+        ])
+        
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        
+        EmotionAnalysis = executor.loader.project_state(self.migrate_to).apps.get_model(
+            'analysis', 'EmotionAnalysis'
+        )
+        rows = list(EmotionAnalysis.objects.order_by('timestamp').values_list(
+            'dominant_emotion', 'dominant_emotion_id'
+        ))
+        self.assertEqual(rows, [('happy', 3), ('sad', 5), ('angry', 0)])
+
+
+class PadBatchesTests(SimpleTestCase):
+    """Tests for padding XLA inference batches to one shape."""
+    
+    def test_pad_batches_keeps_one_shape(self):
+        """Test that every batch reaches the model at the fixed size and padding is dropped."""
+        shapes = []
+        
+        def infer(batch):
+            shapes.append(batch.shape)
+            return batch.reshape(len(batch), -1)[:, :3]
+        
+        batch = np.random.rand(5, 48, 48, 1).astype(np.float32)
+        output = _pad_batches(infer, batch_size=4)(batch)
+        
+        self.assertEqual(shapes, [(4, 48, 48, 1), (4, 48, 48, 1)])
+        np.testing.assert_array_equal(output, batch.reshape(5, -1)[:, :3])
+
+
+# Frames returned by the mocked detector: happy, happy, then sad
+ANALYZED_FRAMES = [
+    {'timestamp': 0.0, 'angry': 0.1, 'sad': 0.2, 'happy': 0.7},
+    {'timestamp': 1.0, 'angry': 0.1, 'sad': 0.1, 'happy': 0.8},
+    {'timestamp': 2.0, 'angry': 0.2, 'sad': 0.6, 'happy': 0.2},
+]
+
+
+class WarmDetectorTests(SimpleTestCase):
+    """Tests for loading the emotion model as worker processes start."""
+    
+    def warm(self, consume_from):
+        queues = analyze_video_emotions.app.amqp.queues
+        with mock.patch.object(type(queues), 'consume_from', new_callable=mock.PropertyMock, return_value=consume_from), \
+                mock.patch('analysis.tasks._get_detector') as get_detector:
+            _warm_detector()
+        return get_detector.called
+    
+    def test_analysis_worker_loads_model(self):
+        """Test that a worker consuming the analysis queue loads the model up front."""
+        self.assertTrue(self.warm({settings.EMOTION_ANALYSIS_QUEUE: None}))
+    
+    def test_other_worker_skips_model(self):
+        """Test that a worker on other queues does not load the model."""
+        self.assertFalse(self.warm({'celery': None}))
+
+
+class AnalyzeVideoTaskTests(TestCase):
+    """Tests for the analyze_video_emotions task."""
+    
+    def setUp(self):
+        self.video = Video.objects.create(
+            title="Task Video",
+            file=SimpleUploadedFile("task.mp4", b"task video content", content_type="video/mp4")
+        )
+        self.addCleanup(self.video.file.storage.delete, self.video.file.name)
+        
+        patcher = mock.patch.object(
+            EmotionDetector, 'analyze_video_parallel', return_value=ANALYZED_FRAMES
+        )
+        self.analyze_video_parallel = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def create_analyzed_duplicate(self, frame_rate=1.0):
+        """Create a completed video of the same file, analyzed at frame_rate"""
+        digest = self.video.compute_sha256()
+        original = Video.objects.create(
+            title="Original Video",
+            file=SimpleUploadedFile("original.mp4", b"task video content", content_type="video/mp4"),
+            sha256=digest,
+            analysis_key=_analysis_key(digest, EmotionDetector().model_path, frame_rate, 5.0),
+            status='completed'
+        )
+        self.addCleanup(original.file.storage.delete, original.file.name)
+        EmotionAnalysis.bulk_ingest(original, [0.0, 1.0], [[0.8, 0.1, 0.1], [0.1, 0.1, 0.8]], ('angry', 'sad', 'happy'))
+        return original
+    
+    def run_task(self):
+        result = analyze_video_emotions(str(self.video.id))
+        self.video.refresh_from_db()
+        if self.video.data_csv_file:
+            self.addCleanup(self.video.data_csv_file.storage.delete, self.video.data_csv_file.name)
+        return result
+    
+    def test_analysis_stores_results_and_completes(self):
+        """Test that a pending video gets its frames, timeline and summary, then completes."""
+        self.assertTrue(self.run_task())
+        
+        self.assertEqual(self.video.status, 'completed')
+        self.assertEqual(
+            list(self.video.emotion_analyses.order_by('timestamp').values_list('dominant_emotion', flat=True)),
+            ['happy', 'happy', 'sad']
+        )
+        self.assertEqual(
+            list(self.video.emotion_timeline.order_by('start_time').values_list('dominant_emotion', flat=True)),
+            ['happy', 'sad']
+        )
+        summary = EmotionAnalysisSummary.objects.get(video=self.video)
+        self.assertEqual((summary.total_frames, summary.happy_count, summary.sad_count), (3, 2, 1))
+        self.assertTrue(self.video.sha256)
+    
+    def test_video_not_pending_is_not_claimed(self):
+        """Test that a video another task already claimed is left alone."""
+        Video.objects.filter(pk=self.video.pk).update(status='processing')
+        
+        self.assertFalse(self.run_task())
+        
+        self.analyze_video_parallel.assert_not_called()
+        self.assertEqual(self.video.status, 'processing')
+        self.assertFalse(self.video.emotion_analyses.exists())
+    
+    def test_duplicate_file_reuses_analysis(self):
+        """Test that a completed video with the same digest is copied instead of analyzed."""
+        original = self.create_analyzed_duplicate()
+        
+        self.assertTrue(self.run_task())
+        
+        self.analyze_video_parallel.assert_not_called()
+        self.assertEqual(self.video.sha256, original.sha256)
+        self.assertEqual(self.video.analysis_key, original.analysis_key)
+        self.assertEqual(
+            list(self.video.emotion_analyses.order_by('timestamp').values_list('dominant_emotion', flat=True)),
+            ['angry', 'happy']
+        )
+    
+    def test_duplicate_with_other_parameters_is_not_reused(self):
+        """Test that a duplicate analyzed at another frame rate is not copied."""
+        self.create_analyzed_duplicate(frame_rate=2.0)
+        
+        self.assertTrue(self.run_task())
+        
+        self.analyze_video_parallel.assert_called_once()
+        self.assertEqual(self.video.emotion_analyses.count(), len(ANALYZED_FRAMES))
+    
+    def test_reanalysis_does_not_reuse_duplicates(self):
+        """Test that the model runs again when duplicate reuse is turned off."""
+        self.create_analyzed_duplicate()
+        
+        self.assertTrue(analyze_video_emotions(str(self.video.id), reuse_duplicates=False))
+        
+        self.analyze_video_parallel.assert_called_once()
+        self.assertEqual(self.video.emotion_analyses.count(), len(ANALYZED_FRAMES))
+    
+    def test_failure_while_storing_leaves_no_partial_results(self):
+        """Test that results are written in one transaction with the completed status."""
+        with mock.patch('analysis.tasks.create_emotion_timeline', side_effect=RuntimeError):
+            self.assertFalse(self.run_task())
+        
+        self.assertEqual(self.video.status, 'failed')
+        self.assertFalse(self.video.emotion_analyses.exists())
+        self.assertFalse(EmotionAnalysisSummary.objects.filter(video=self.video).exists())
+    
+    def test_reset_during_analysis_discards_results(self):
+        """Test that a run whose video was reset for reanalysis does not complete it."""
+        def reset_then_return_frames(*args, **kwargs):
+            Video.objects.filter(pk=self.video.pk).update(status='pending')
+            return ANALYZED_FRAMES
+        self.analyze_video_parallel.side_effect = reset_then_return_frames
+        
+        self.assertFalse(self.run_task())
+        
+        self.assertEqual(self.video.status, 'pending')
+        self.assertFalse(self.video.emotion_analyses.exists())
+        self.assertFalse(self.video.emotion_timeline.exists())
+
+
+class VideoAnalysisActionTests(APITestCase):
+    """Tests for the reanalyze action and cached analysis responses."""
+    
+    def setUp(self):
+        Group.objects.get_or_create(name='SuperAdmin')
+        self.superadmin = get_user_model().objects.create_superadmin(
+            email='superadmin@example.com',
+            name='Super Admin',
+            password='password123'
+        )
+        self.client.force_authenticate(user=self.superadmin)
+        
+        self.video = Video.objects.create(
+            title="Analyzed Video",
+            file=SimpleUploadedFile("analyzed.mp4", b"analyzed video content", content_type="video/mp4"),
+            status='completed'
+        )
+        self.addCleanup(self.video.file.storage.delete, self.video.file.name)
+        EmotionAnalysis.bulk_ingest(self.video, [0.0, 1.0], [[0.8, 0.1, 0.1], [0.1, 0.1, 0.8]], ('angry', 'sad', 'happy'))
+        create_emotion_timeline(self.video, [0.0, 1.0], np.array([[0.8, 0.1, 0.1], [0.1, 0.1, 0.8]]))
+        EmotionAnalysisSummary.rebuild(self.video)
+        cache.clear()
+    
+    def test_reanalyze_clears_results_and_enqueues_after_commit(self):
+        """Test that reanalyze resets the video, clears its results and queues one task on commit."""
+        url = reverse('videos-reanalyze', kwargs={'pk': self.video.id})
+        
+        with mock.patch('analysis.views.analyze_video_emotions') as task:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(url)
+            task.apply_async.assert_not_called()
+            for callback in callbacks:
+                callback()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task.apply_async.assert_called_once_with(
+            args=[str(self.video.id)], kwargs={'reuse_duplicates': False}, priority=REANALYSIS_PRIORITY
+        )
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'pending')
+        for model in (EmotionAnalysis, EmotionTimeline, EmotionAnalysisSummary):
+            self.assertFalse(model.objects.filter(video=self.video).exists())
+    
+    def test_cached_summary_is_replaced_when_video_is_updated(self):
+        """Test that cached responses are reused until the video's updated_at changes."""
+        url = reverse('videos-emotion-summary', kwargs={'pk': self.video.id})
+        first = self.client.get(url).data['happy_avg']
+        
+        EmotionAnalysisSummary.objects.filter(video=self.video).update(happy_avg=0.99)
+        self.assertEqual(self.client.get(url).data['happy_avg'], first)
+        
+        Video.objects.filter(pk=self.video.pk).update(updated_at=timezone.now())
+        self.assertEqual(self.client.get(url).data['happy_avg'], 0.99)
@@ -1,19 +1,73 @@
 import os
-import cv2
+import queue
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-import tensorflow as tf
 from django.conf import settings
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from . import frame_cache
 import logging
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# TensorFlow and OpenCV are imported inside the methods that use them so that
+# importing this module (e.g. via the Celery tasks at Django startup) stays cheap
+
+def _iter_in_thread(iterable, maxsize: int) -> Iterator:
+    """
+    Consume iterable on a background thread and yield its items through a bounded
+    queue, so producing the next items overlaps with the caller's work on earlier
+    ones. Exceptions from the iterable are re-raised in the caller.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                items.put((True, item))
+            items.put((False, None))
+        except Exception as e:
+            items.put((False, e))
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+    
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            has_item, item = items.get()
+            if not has_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        # Stop the producer and unblock it if it is waiting on a full queue
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
 class EmotionDetector:
     """Class to handle emotion detection in video frames"""
     
+    # Frame interval from which iter_frames seeks to each sampled frame instead of
+    # decoding every frame in between (about 10s at 30 fps, past most keyframe gaps)
+    SEEK_MIN_INTERVAL = 300
+    
+    # Widest image the face detector runs on; larger frames are downscaled first
+    FACE_DETECTION_WIDTH = 640
+    
     def __init__(self, model_path=None):
         """Initialize the emotion detector with a model path"""
         if model_path is None:
@@ -23,15 +77,20 @@ class EmotionDetector:
             self.model_path = model_path
         
         self.model = None
+        self.infer = None
         # Updated emotions list to match new model
         self.emotions = ['angry', 'sad', 'happy']
         # Updated image size to 48x48 to match new model
         self.img_size = (48, 48)
+        # Crop each frame to its largest face before classifying it, skipping faceless frames
+        self.detect_faces = settings.EMOTION_DETECT_FACES
+        # Cascade classifiers are not thread-safe, so each thread loads its own
+        self._local = threading.local()
         logger.info(f"EmotionDetector initialized with model path: {self.model_path}")
     
     def load_model(self) -> bool:
         """
-        Load the TensorFlow model
+        Load the TensorFlow model, shared with every other detector in this process
         Returns:
             bool: True if model loaded successfully, False otherwise
         """
@@ -44,23 +103,11 @@ class EmotionDetector:
                     logger.error(f"Model file not found at {self.model_path}")
                     return False
                 
-                # Define custom BatchNormalization class
-                class CustomBatchNormalization(tf.keras.layers.BatchNormalization):
-                    def __init__(self, **kwargs):
-                        if 'axis' in kwargs and isinstance(kwargs['axis'], list):
-                            kwargs['axis'] = kwargs['axis'][0]
-                        super(CustomBatchNormalization, self).__init__(**kwargs)
+                from analysis.cnn.runtime import get_runtime
                 
-                # Load model with custom objects
-                self.model = tf.keras.models.load_model(
-                    self.model_path, 
-                    custom_objects={'BatchNormalization': CustomBatchNormalization},
-                    compile=False
-                )
-                self.model.compile(
-                    optimizer=tf.keras.optimizers.Adam(learning_rate=0.0001),
-                    loss='categorical_crossentropy',
-                    metrics=['accuracy']
+                # Loaded and warmed up once per worker process, not once per task
+                self.model, self.infer = get_runtime(
+                    self.model_path, settings.EMOTION_MODEL_BACKEND, self.calibration_images()
                 )
                 logger.info(f"Model loaded successfully from {self.model_path}")
                 return True
@@ -69,22 +116,32 @@ class EmotionDetector:
                 return False
         return True
     
-    def process_frame(self, frame) -> Optional[Dict[str, float]]:
+    @staticmethod
+    def calibration_images(limit: int = 100) -> List[str]:
+        """Return up to limit face crops from EMOTION_MODEL_CALIBRATION_DIR for int8 calibration"""
+        directory = settings.EMOTION_MODEL_CALIBRATION_DIR
+        if not directory or not os.path.isdir(directory):
+            return []
+        names = sorted(
+            name for name in os.listdir(directory)
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        )
+        return [os.path.join(directory, name) for name in names[:limit]]
+    
+    def preprocess_frame(self, frame) -> Optional[np.ndarray]:
         """
-        Process a single frame and return emotion predictions
+        Convert a frame into a normalized (1, 48, 48, 1) float32 model input
         
         Args:
             frame: Input image frame as numpy array
             
         Returns:
-            Dictionary with emotion probabilities or None if processing failed
+            Model input array or None if preprocessing failed
         """
-        if not self.load_model():
-            logger.error("Failed to load model for frame processing")
-            return None
-        
         # Resize and preprocess the frame according to new model requirements
         try:
+            import cv2
+            
             # Check if frame is valid
             if frame is None or not isinstance(frame, np.ndarray):
                 logger.error(f"Invalid frame type: {type(frame)}")
@@ -95,93 +152,244 @@ class EmotionDetector:
                 img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             else:
                 img = frame  # Assume it's already grayscale
-                
-            img = cv2.resize(img, self.img_size)
             
-            # Normalize pixel values (0-255 to 0-1)
-            img = img / 255.0
+            if self.detect_faces:
+                img = self.crop_face(img)
+                if img is None:
+                    logger.debug("No face found in frame")
+                    return None
+                
+            img = cv2.resize(img, self.img_size).astype(np.float32)
             
-            # Reshape for model input (add batch dimension and channel dimension)
-            img_array = np.expand_dims(img, axis=0)  # Add batch dimension
-            img_array = np.expand_dims(img_array, axis=-1)  # Add channel dimension
+            # Normalize pixel values (0-255 to 0-1) in place, without a float64 temporary
+            np.multiply(img, np.float32(1.0 / 255.0), out=img)
             
-            # Get predictions
-            predictions = self.model.predict(img_array, verbose=0)
+            # Add the batch and channel dimensions as a view
+            return img.reshape(1, self.img_size[1], self.img_size[0], 1)
+        except Exception as e:
+            logger.error(f"Error preprocessing frame: {str(e)}", exc_info=True)
+            return None
+    
+    def crop_face(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Return the largest face in a grayscale frame, or None if no face is found
+        
+        Args:
+            gray: Grayscale frame as numpy array
             
-            # Create dictionary of emotion probabilities
-            results = {}
-            for i, emotion in enumerate(self.emotions):
-                results[emotion] = float(predictions[0][i])
+        Returns:
+            View of the frame cropped to the face bounding box
+        """
+        import cv2
+        
+        cascade = getattr(self._local, 'face_cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(
+                os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+            )
+            self._local.face_cascade = cascade
+        
+        # Detect on a downscaled copy, as the cascade's cost grows with the frame area
+        scale = min(1.0, self.FACE_DETECTION_WIDTH / gray.shape[1])
+        small = gray if scale == 1.0 else cv2.resize(
+            gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+        faces = cascade.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        if not len(faces):
+            return None
+        
+        x, y, w, h = (int(v / scale) for v in max(faces.tolist(), key=lambda face: face[2] * face[3]))
+        return gray[y:y + h, x:x + w]
+    
+    def predict_batch(self, img_batch: np.ndarray) -> Optional[List[Dict[str, float]]]:
+        """
+        Run the model once on a batch of preprocessed frames
+        
+        Args:
+            img_batch: (N, 48, 48, 1) float32 model inputs from preprocess_frame
             
-            # Log the highest emotion for debugging
-            max_emotion = max(results, key=results.get)
-            logger.debug(f"Frame analyzed - dominant emotion: {max_emotion} ({results[max_emotion]:.4f})")
-                
-            return results
+        Returns:
+            One dictionary of emotion probabilities per frame or None if inference failed
+        """
+        # Standalone calls load the model on first use; analyze_video loads it up front
+        if self.infer is None and not self.load_model():
+            logger.error("Failed to load model for frame processing")
+            return None
+        
+        try:
+            predictions = np.asarray(self.infer(img_batch))
+            return [dict(zip(self.emotions, row)) for row in predictions.tolist()]
         except Exception as e:
-            logger.error(f"Error processing frame: {str(e)}", exc_info=True)
+            logger.error(f"Error processing frames: {str(e)}", exc_info=True)
             return None
     
-    def extract_frames(self, video_path: str, frame_rate: float = 1.0) -> List[Tuple[np.ndarray, float]]:
+    def predict(self, img_array: np.ndarray) -> Optional[Dict[str, float]]:
         """
-        Extract frames from a video file at a specified frame rate
+        Run the model on a preprocessed frame and return emotion predictions
         
         Args:
-            video_path: Path to the video file
-            frame_rate: Number of frames per second to extract
+            img_array: Model input from preprocess_frame
             
         Returns:
-            List of tuples: (frame, timestamp)
+            Dictionary with emotion probabilities or None if inference failed
+        """
+        results = self.predict_batch(img_array)
+        if not results:
+            return None
+        
+        # Log the highest emotion for debugging
+        max_emotion = max(results[0], key=results[0].get)
+        logger.debug(f"Frame analyzed - dominant emotion: {max_emotion} ({results[0][max_emotion]:.4f})")
+        return results[0]
+    
+    def process_frame(self, frame) -> Optional[Dict[str, float]]:
         """
-        frames = []
+        Process a single frame and return emotion predictions
+        
+        Args:
+            frame: Input image frame as numpy array
+            
+        Returns:
+            Dictionary with emotion probabilities or None if processing failed
+        """
+        img_array = self.preprocess_frame(frame)
+        if img_array is None:
+            return None
+        return self.predict(img_array)
+    
+    @staticmethod
+    def _prefetch_file(path: str) -> None:
+        """Ask the kernel to read the whole file ahead, where posix_fadvise is available"""
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Could not prefetch {path}: {str(e)}")
+    
+    @staticmethod
+    def _open_capture(video_path: str):
+        """
+        Open a video through FFmpeg, asking for hardware decoding when enabled.
+        OpenCV falls back to software decoding when no accelerator is available;
+        builds without hardware acceleration support open the file normally.
+        """
+        import cv2
+        
+        if settings.EMOTION_HW_DECODE and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            video = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+            ])
+            if video.isOpened():
+                logger.debug(f"Opened {video_path} with hardware acceleration "
+                             f"{int(video.get(cv2.CAP_PROP_HW_ACCELERATION))}")
+                return video
+            video.release()
+        return cv2.VideoCapture(video_path)
+    
+    def get_frame_count(self, video_path: str) -> int:
+        """Return the frame count reported by the video container, or 0 if unreadable"""
+        import cv2
         
+        video = cv2.VideoCapture(video_path)
         try:
+            return int(video.get(cv2.CAP_PROP_FRAME_COUNT)) if video.isOpened() else 0
+        finally:
+            video.release()
+    
+    def iter_frames(self, video_path: str, frame_rate: float = 1.0,
+                    start_frame: int = 0, end_frame: Optional[int] = None) -> Iterator[Tuple[np.ndarray, float]]:
+        """
+        Lazily extract frames from a video file at a specified frame rate
+        
+        Args:
+            video_path: Path to the video file
+            frame_rate: Number of frames per second to extract
+            start_frame: First frame index of the range to extract
+            end_frame: Frame index at which to stop (exclusive), None for the end of the video
+            
+        Yields:
+            Tuples of (frame, timestamp), one decoded frame alive at a time
+        """
+        try:
+            import cv2
+            
             # Check if file exists and is readable
             if not os.path.exists(video_path):
                 logger.error(f"Video file does not exist: {video_path}")
-                return frames
+                return
                 
+            # Start reading the file into the page cache so disk I/O overlaps decoding
+            self._prefetch_file(video_path)
+            
             # Open video file
-            video = cv2.VideoCapture(video_path)
+            video = self._open_capture(video_path)
             if not video.isOpened():
                 logger.error(f"Error: Could not open video file {video_path}")
-                return frames
+                return
             
-            # Get video properties
-            fps = video.get(cv2.CAP_PROP_FPS)
-            frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = frame_count / fps if fps > 0 else 0
-            
-            if fps <= 0 or frame_count <= 0:
-                logger.error(f"Invalid video properties: fps={fps}, frame_count={frame_count}")
-                video.release()
-                return frames
-            
-            # Calculate frame interval based on desired frame_rate
-            frame_interval = max(1, int(fps / frame_rate))
+            try:
+                # Get video properties
+                fps = video.get(cv2.CAP_PROP_FPS)
+                frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+                duration = frame_count / fps if fps > 0 else 0
                 
-            logger.info(f"Video properties - FPS: {fps:.2f}, Duration: {duration:.2f}s, "
-                       f"Frame count: {frame_count}, Frame interval: {frame_interval}")
-            
-            # Extract frames at the specified interval
-            current_frame = 0
-            frames_read = 0
-            frames_extracted = 0
-            
-            while True:
-                ret, frame = video.read()
-                if not ret:
-                    break
+                if fps <= 0 or frame_count <= 0:
+                    logger.error(f"Invalid video properties: fps={fps}, frame_count={frame_count}")
+                    return
                 
-                frames_read += 1
-                if current_frame % frame_interval == 0:
-                    timestamp = current_frame / fps
-                    frames.append((frame.copy(), timestamp))
-                    frames_extracted += 1
+                # Calculate frame interval based on desired frame_rate
+                frame_interval = max(1, int(fps / frame_rate))
                     
-                current_frame += 1
+                logger.info(f"Video properties - FPS: {fps:.2f}, Duration: {duration:.2f}s, "
+                           f"Frame count: {frame_count}, Frame interval: {frame_interval}")
                 
-            video.release()
+                # Extract frames at the specified interval, starting from the first
+                # sampled frame in the range so every range samples the same frames
+                current_frame = -(-start_frame // frame_interval) * frame_interval
+                if current_frame:
+                    video.set(cv2.CAP_PROP_POS_FRAMES, current_frame)
+                frames_read = 0
+                frames_extracted = 0
+                
+                # read() and retrieve() return a newly allocated array on every call,
+                # so frames are yielded as is without copying
+                if frame_interval >= self.SEEK_MIN_INTERVAL:
+                    # Samples lie further apart than typical keyframe spacing, so seeking
+                    # to each one decodes fewer frames than reading every frame between them
+                    while end_frame is None or current_frame < end_frame:
+                        if frames_read:
+                            video.set(cv2.CAP_PROP_POS_FRAMES, current_frame)
+                        ret, frame = video.read()
+                        if not ret:
+                            break
+                        
+                        frames_read += 1
+                        yield frame, current_frame / fps
+                        frames_extracted += 1
+                        current_frame += frame_interval
+                else:
+                    # grab() only advances the decoder; frames between samples are never
+                    # converted to BGR and copied out, which retrieve() does for sampled ones
+                    while end_frame is None or current_frame < end_frame:
+                        if not video.grab():
+                            break
+                        
+                        frames_read += 1
+                        if current_frame % frame_interval == 0:
+                            ret, frame = video.retrieve()
+                            if ret:
+                                timestamp = current_frame / fps
+                                yield frame, timestamp
+                                frames_extracted += 1
+                            
+                        current_frame += 1
+            finally:
+                video.release()
             
             # Validate extraction
             if frames_extracted == 0:
@@ -189,63 +397,199 @@ class EmotionDetector:
             else:
                 logger.info(f"Extracted {frames_extracted} frames from video (read {frames_read} frames)")
                 
-            return frames
-            
         except Exception as e:
             logger.error(f"Error extracting frames: {str(e)}", exc_info=True)
-            return frames
-    
-    def analyze_video(self, video_path: str, frame_rate: float = 1.0) -> List[Dict]:
+
+    def iter_model_inputs(self, video_path: str, frame_rate: float = 1.0, start_frame: int = 0,
+                          end_frame: Optional[int] = None) -> Iterator[Tuple[float, Optional[np.ndarray]]]:
+        """
+        Yield (timestamp, model input) for every sampled frame, the input being None
+        when preprocessing failed. Inputs come from the frame cache when this file
+        and range were decoded before, otherwise they are decoded and cached.
         """
-        Analyze a video file and return emotion data for each frame
+        path = frame_cache.cache_path(video_path, frame_rate, start_frame, end_frame, self.detect_faces)
+        cached = frame_cache.load(path)
+        if cached is not None:
+            timestamps, inputs = cached
+            logger.info(f"Using {len(timestamps)} cached frames for {video_path}")
+            for i, timestamp in enumerate(timestamps.tolist()):
+                yield timestamp, np.array(inputs[i:i + 1])
+            return
+
+        timestamps = []
+        inputs = []
+        for frame, timestamp in self.iter_frames(video_path, frame_rate, start_frame, end_frame):
+            img_array = self.preprocess_frame(frame)
+            if img_array is not None and path is not None:
+                timestamps.append(timestamp)
+                inputs.append(img_array)
+            yield timestamp, img_array
+
+        if inputs:
+            frame_cache.store(path, timestamps, np.concatenate(inputs))
+
+    def extract_frames(self, video_path: str, frame_rate: float = 1.0) -> List[Tuple[np.ndarray, float]]:
+        """
+        Extract frames from a video file at a specified frame rate
         
         Args:
             video_path: Path to the video file
-            frame_rate: Number of frames per second to analyze
+            frame_rate: Number of frames per second to extract
             
         Returns:
-            List of dictionaries with timestamp and emotion data
+            List of tuples: (frame, timestamp)
         """
-        results = []
+        return list(self.iter_frames(video_path, frame_rate))
+    
+    def analyze_video(self, video_path: str, frame_rate: float = 1.0,
+                      similarity_threshold: float = 0.0, refresh_interval: int = 30,
+                      start_frame: int = 0, end_frame: Optional[int] = None,
+                      batch_size: int = 32) -> Iterator[Dict]:
+        """
+        Analyze a video file and yield emotion data for each frame as it is decoded
         
-        try:
-            # Extract frames from the video
-            logger.info(f"Starting frame extraction for {video_path} at {frame_rate} fps")
-            frames = self.extract_frames(video_path, frame_rate)
+        Args:
+            video_path: Path to the video file
+            frame_rate: Number of frames per second to analyze
+            similarity_threshold: Mean absolute pixel difference (0-255) of the 48x48
+                model input below which a frame reuses the last inferred frame's
+                predictions instead of running the model; 0 disables reuse
+            refresh_interval: Maximum number of consecutive frames that may reuse
+                one inference before the model is run again
+            start_frame: First frame index of the range to analyze
+            end_frame: Frame index at which to stop (exclusive), None for the end of the video
+            batch_size: Number of frames sent through the model per forward pass
             
-            if not frames:
-                logger.error("No frames extracted from video")
-                return results
+        Yields:
+            Dictionaries with timestamp and emotion data, in timestamp order
+        """
+        processed_count = 0
+        failed_count = 0
+        reused_count = 0
+        
+        # Inputs waiting for the next forward pass and the one-item cells their
+        # predictions are written to. Every decoded frame is queued in pending
+        # with the cell it reads from; frames reusing an inference share its cell.
+        batch_inputs = []
+        batch_cells = []
+        pending = []
+        
+        # Model input and cell of the last frame queued for inference
+        reference_input = None
+        reference_cell = None
+        reuse_streak = 0
+        
+        def drain():
+            nonlocal processed_count, failed_count, reference_input
+            if batch_inputs:
+                predictions = self.predict_batch(np.concatenate(batch_inputs))
+                for i, cell in enumerate(batch_cells):
+                    cell[0] = predictions[i] if predictions else None
+                batch_inputs.clear()
+                batch_cells.clear()
                 
-            # Process each frame
-            logger.info(f"Processing {len(frames)} frames for emotion detection")
-            processed_count = 0
-            failed_count = 0
-            
-            for frame, timestamp in frames:
-                emotion_data = self.process_frame(frame)
-                if emotion_data:
-                    result = {
+                # Never compare later frames against a frame whose inference failed
+                if reference_cell is not None and reference_cell[0] is None:
+                    reference_input = None
+            
+            for timestamp, cell in pending:
+                if cell[0]:
+                    yield {
                         'timestamp': timestamp,
-                        **emotion_data
+                        **cell[0]
                     }
-                    results.append(result)
                     processed_count += 1
                 else:
                     failed_count += 1
+            pending.clear()
+        
+        # Load the model once, rather than checking for it before every batch
+        if not self.load_model():
+            logger.error(f"Failed to load model, not analyzing {video_path}")
+            return
+        
+        try:
+            # Frames are decoded one at a time and only their small model inputs are batched.
+            # Decoding runs on its own thread, filling the next batch while this one is inferred.
+            logger.info(f"Starting emotion analysis for {video_path} at {frame_rate} fps")
+            
+            model_inputs = _iter_in_thread(
+                self.iter_model_inputs(video_path, frame_rate, start_frame, end_frame),
+                maxsize=2 * batch_size
+            )
+            for timestamp, img_array in model_inputs:
+                if img_array is None:
+                    cell = [None]
+                elif (reference_input is not None and reuse_streak < refresh_interval
+                        and np.abs(img_array - reference_input).mean() * 255.0 < similarity_threshold):
+                    # Nearly identical to the reference frame, skip the forward pass
+                    cell = reference_cell
+                    reuse_streak += 1
+                    reused_count += 1
+                else:
+                    cell = [None]
+                    batch_inputs.append(img_array)
+                    batch_cells.append(cell)
+                    reference_input, reference_cell = img_array, cell
+                    reuse_streak = 0
+                
+                pending.append((timestamp, cell))
+                if len(batch_inputs) >= batch_size:
+                    yield from drain()
+            
+            yield from drain()
             
-            success_rate = processed_count / len(frames) if frames else 0
+            total = processed_count + failed_count
+            if not total:
+                logger.error("No frames extracted from video")
+                return
+            
+            success_rate = processed_count / total
             logger.info(f"Video analysis completed - Processed: {processed_count}, "
-                       f"Failed: {failed_count}, Success rate: {success_rate:.2%}")
+                       f"Reused: {reused_count}, Failed: {failed_count}, "
+                       f"Success rate: {success_rate:.2%}")
             
             if failed_count > 0:
                 logger.warning(f"Some frames ({failed_count}) could not be processed")
             
-            # Sort results by timestamp
-            results.sort(key=lambda x: x['timestamp'])
-            
-            return results
-            
         except Exception as e:
             logger.error(f"Error analyzing video: {str(e)}", exc_info=True)
-            return results
\ No newline at end of file
+    
+    def analyze_video_parallel(self, video_path: str, frame_rate: float = 1.0,
+                               similarity_threshold: float = 0.0, max_workers: int = 1) -> Iterator[Dict]:
+        """
+        Analyze contiguous frame ranges of a video on a thread pool and yield
+        the results in timestamp order. OpenCV decoding and TensorFlow inference
+        release the GIL, and threads share the already loaded model.
+        
+        Args:
+            video_path: Path to the video file
+            frame_rate: Number of frames per second to analyze
+            similarity_threshold: See analyze_video
+            max_workers: Number of ranges analyzed concurrently; 1 analyzes serially
+            
+        Yields:
+            Dictionaries with timestamp and emotion data, in timestamp order
+        """
+        frame_count = self.get_frame_count(video_path) if max_workers > 1 else 0
+        if frame_count < max_workers:
+            yield from self.analyze_video(video_path, frame_rate, similarity_threshold)
+            return
+        
+        # Load the model once up front rather than racing to load it from every thread
+        self.load_model()
+        
+        # The last range runs to the end, as container frame counts can be short
+        bounds = np.linspace(0, frame_count, max_workers + 1).astype(int).tolist()
+        ranges = list(zip(bounds[:-1], bounds[1:-1] + [None]))
+        
+        def analyze_range(start_frame, end_frame):
+            return list(self.analyze_video(
+                video_path, frame_rate, similarity_threshold,
+                start_frame=start_frame, end_frame=end_frame
+            ))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(analyze_range, start, end) for start, end in ranges]
+            for future in futures:
+                yield from future.result()
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+from django.conf import settings
+from typing import Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of the preprocessed model inputs of a video, so analyzing the
+# same file again (e.g. after a model update) skips decoding it. Entries are
+# evicted least recently used first once the cache outgrows its size limit.
+
+def cache_path(video_path: str, *params) -> Optional[str]:
+    """
+    Return the cache file for video_path decoded with params, or None when
+    caching is disabled. The key covers the file's size and modification time
+    so a replaced file never hits a stale entry.
+    """
+    if settings.EMOTION_FRAME_CACHE_MAX_BYTES <= 0:
+        return None
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return None
+    key = hashlib.blake2b(
+        f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}:{params}".encode(),
+        digest_size=16
+    ).hexdigest()
+    return os.path.join(settings.EMOTION_FRAME_CACHE_DIR, f"{key}.npy")
+
+def load(path: Optional[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Return the cached (timestamps, inputs) arrays at path, or None on a miss"""
+    if path is None:
+        return None
+    try:
+        data = np.load(path, mmap_mode='r')
+        # Mark the entry as recently used, as atime is often not updated on read
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+
+    # Column 0 holds the timestamp, the rest the flattened 48x48 input
+    timestamps = np.array(data[:, 0], dtype=np.float64)
+    inputs = data[:, 1:].reshape(len(data), 48, 48, 1)
+    return timestamps, inputs
+
+def store(path: Optional[str], timestamps, inputs: np.ndarray) -> None:
+    """Write (timestamps, inputs) to path atomically, then enforce the size limit"""
+    if path is None or not len(inputs):
+        return
+    data = np.empty((len(inputs), 1 + 48 * 48), dtype=np.float32)
+    data[:, 0] = timestamps
+    data[:, 1:] = inputs.reshape(len(inputs), -1)
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logger.warning(f"Could not write frame cache {path}: {str(e)}")
+        return
+    evict()
+
+def evict(max_bytes: Optional[int] = None) -> None:
+    """Delete the least recently used entries until the cache fits in max_bytes"""
+    if max_bytes is None:
+        max_bytes = settings.EMOTION_FRAME_CACHE_MAX_BYTES
+    entries = []
+    try:
+        for entry in os.scandir(settings.EMOTION_FRAME_CACHE_DIR):
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
@@ -1,10 +1,19 @@
+import functools
+import hashlib
+import logging
 import os
 import uuid
 from django.conf import settings
-from django.http import HttpResponse
-from django.shortcuts import render, get_object_or_404
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Subquery
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
 from rest_framework import viewsets, status, permissions, parsers, filters
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
@@ -15,6 +24,8 @@ from drf_spectacular.utils import (
 from drf_spectacular.openapi import AutoSchema
 
 from .models import Video, EmotionAnalysis, EmotionAnalysisSummary, EmotionTimeline
+from .parsers import StoredUploadedFile, StreamingMultiPartParser
+from .signals import VIDEO_COUNT_VERSION_KEY
 from .serializers import (
     VideoSerializer, 
     VideoInitSerializer, 
@@ -26,6 +37,92 @@ from .serializers import (
 )
 from .tasks import analyze_video_emotions  # Temporarily commented out
 
+logger = logging.getLogger(__name__)
+
+# Celery priorities of analysis tasks (higher runs first); routing is set in CELERY_TASK_ROUTES
+UPLOAD_ANALYSIS_PRIORITY = 3
+REANALYSIS_PRIORITY = 8
+
+# Seconds the data of a video's read-only analysis actions is cached
+VIDEO_RESPONSE_TIMEOUT = 3600
+
+# Seconds a video list count is reused across page requests of the same listing
+VIDEO_COUNT_TIMEOUT = 60
+
+
+class CachedCountPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination that caches the total count per listing query, so
+    paging through the same filtered list does not re-run its COUNT(*)
+    """
+
+    def get_count(self, queryset):
+        version = cache.get(VIDEO_COUNT_VERSION_KEY, 0)
+        query_hash = hashlib.md5(f'{version}:{queryset.query}'.encode()).hexdigest()
+        cache_key = f'video_count_{query_hash}'
+        count = cache.get(cache_key)
+        if count is None:
+            count = super().get_count(queryset)
+            cache.set(cache_key, count, VIDEO_COUNT_TIMEOUT)
+        return count
+
+
+class OptionalLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination applied only when the request passes ?limit=, so
+    clients that expect the full list keep receiving a plain array
+    """
+    default_limit = None
+
+
+# Query parameters of actions paginated with OptionalLimitOffsetPagination
+OPTIONAL_PAGE_PARAMETERS = [
+    OpenApiParameter(
+        name='limit',
+        description='Number of results per page; omit to receive every result as a plain list',
+        required=False,
+        type=int,
+        location=OpenApiParameter.QUERY
+    ),
+    OpenApiParameter(
+        name='offset',
+        description='Index of the first result of the page',
+        required=False,
+        type=int,
+        location=OpenApiParameter.QUERY
+    )
+]
+
+
+def cache_video_response(timeout=VIDEO_RESPONSE_TIMEOUT, paginated_only=False):
+    """
+    Cache the data of a successful detail action response per video and URL.
+    The key includes the video's updated_at, which every status change and
+    reanalysis bumps, so stale entries are never read rather than deleted.
+    Access is still checked by get_object() before the cache is consulted.
+    With paginated_only, only ?limit= pages are cached, keeping full lists of
+    unbounded size out of the cache.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, pk=None):
+            if paginated_only and 'limit' not in request.query_params:
+                return view(self, request, pk)
+            video = self.get_object()
+            path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            cache_key = f'video_response_{video.pk}_{video.updated_at.timestamp()}_{path_hash}'
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+            
+            response = view(self, request, pk)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(cache_key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="List therapy session videos",
@@ -227,7 +324,8 @@ class VideoViewSet(viewsets.ModelViewSet):
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
-    parser_classes = [parsers.MultiPartParser, parsers.FormParser]
+    pagination_class = CachedCountPagination
+    parser_classes = [StreamingMultiPartParser, parsers.FormParser]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['uploaded_at', 'title']
@@ -237,28 +335,67 @@ class VideoViewSet(viewsets.ModelViewSet):
             return VideoDetailSerializer
         return self.serializer_class
     
+    def get_object(self):
+        # Cached actions look the video up before the wrapped action does
+        if not hasattr(self, '_video'):
+            self._video = super().get_object()
+        return self._video
+    
+    def get_user_roles(self):
+        """
+        Return the requesting user's group names. The is_superadmin, is_admin and
+        is_manager properties each run a query, so the groups are fetched once
+        and kept for the rest of the request.
+        """
+        if not hasattr(self, '_user_roles'):
+            self._user_roles = frozenset(self.request.user.groups.values_list('name', flat=True))
+        return self._user_roles
+    
     def get_queryset(self):
         user = self.request.user
+        roles = self.get_user_roles()
         queryset = super().get_queryset()
         
-        if not user.is_superadmin:
-            if user.is_admin:
+        if 'SuperAdmin' not in roles:
+            if 'Admin' in roles:
                 queryset = queryset.filter(therapy_session__resident__care_home__admin=user)
-            elif user.is_manager:
-                # Get care homes managed by this manager
+            elif 'Manager' in roles:
+                # Care homes managed by this manager, filtered as a subquery of the same query
                 from carehome_managers.models import CarehomeManagers
-                managed_carehomes = CarehomeManagers.objects.filter(manager=user).values_list('carehome', flat=True)
-                queryset = queryset.filter(therapy_session__resident__care_home__id__in=managed_carehomes)
+                managed_carehomes = CarehomeManagers.objects.filter(manager=user).values('carehome')
+                queryset = queryset.filter(therapy_session__resident__care_home__in=Subquery(managed_carehomes))
+        
+        if self.action == 'retrieve':
+            queryset = VideoDetailSerializer.setup_eager_loading(queryset)
+        elif self.action == 'list':
+            # Load only the columns the list serializer renders
+            queryset = queryset.only(*VideoSerializer.Meta.fields)
         
         return queryset
     
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except Exception:
+            # Streamed uploads are not temporary files, so drop any no video took over
+            for upload in request.FILES.values():
+                if isinstance(upload, StoredUploadedFile) and not upload.committed:
+                    upload.delete()
+            raise
+    
     def perform_create(self, serializer):
         try:
-            video = serializer.save()
-            # Queue video for emotion analysis
-            analyze_video_emotions.delay(str(video.id))
-        except Exception as e:
-            print(f"Error creating video: {str(e)}")
+            upload = serializer.validated_data.get('file')
+            if isinstance(upload, StoredUploadedFile):
+                # The file is already stored at this video's upload path, so only record its name
+                video = serializer.save(id=upload.video_id, file=upload.storage_name)
+                upload.committed = True
+            else:
+                video = serializer.save()
+            # Queue video for emotion analysis behind user-requested reanalyses
+            analyze_video_emotions.apply_async(args=[str(video.id)], priority=UPLOAD_ANALYSIS_PRIORITY)
+        except Exception:
+            logger.exception("Error creating video")
             raise
         
     @extend_schema(
@@ -307,11 +444,9 @@ class VideoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def analysis_status(self, request, pk=None):
         """Get the analysis status of a video"""
-        try:
-            video = self.get_object()
-            return Response({'status': video.status})
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Polled often, so read only the status column of an accessible video
+        row = get_object_or_404(self.get_queryset().values('status'), pk=pk)
+        return Response({'status': row['status']})
     
     @extend_schema(
         summary="Trigger video reanalysis",
@@ -347,22 +482,34 @@ class VideoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def reanalyze(self, request, pk=None):
         """Trigger reanalysis of the video"""
-        try:
-            video = self.get_object()
-            video.status = 'pending'
-            video.save()
+        video = self.get_object()
+        
+        # Reset the status and clear existing analysis in one transaction,
+        # so the video is never left pending with half its old results
+        with transaction.atomic():
+            Video.objects.filter(pk=video.pk).update(
+                status='pending', data_csv_file='', analysis_key='', updated_at=timezone.now()
+            )
             
-            # Clear existing analysis
-            EmotionAnalysis.objects.filter(video=video).delete()
-            EmotionTimeline.objects.filter(video=video).delete()
-            EmotionAnalysisSummary.objects.filter(video=video).delete()
+            # Nothing depends on these rows and no delete signals are connected,
+            # so skip the deletion collector and issue one DELETE per table
+            for model in (EmotionAnalysis, EmotionTimeline, EmotionAnalysisSummary):
+                analyses = model.objects.filter(video_id=video.pk)
+                analyses._raw_delete(analyses.db)
             
-            # Queue video for emotion analysis
-            analyze_video_emotions.delay(str(video.id))
+            # Queue video for emotion analysis once the reset is committed, so the
+            # task cannot run before it and find the video not pending; the model
+            # runs again rather than copying another video's results
+            transaction.on_commit(lambda: analyze_video_emotions.apply_async(
+                args=[str(video.id)], kwargs={'reuse_duplicates': False}, priority=REANALYSIS_PRIORITY
+            ))
             
-            return Response({'status': 'reanalysis queued'})
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # The CSV exported from the old results is removed once they are gone
+            if video.data_csv_file:
+                export_name = video.data_csv_file.name
+                transaction.on_commit(lambda: video.data_csv_file.storage.delete(export_name))
+        
+        return Response({'status': 'reanalysis queued'})
     
     @extend_schema(
         summary="Get emotion analysis frames",
@@ -370,6 +517,7 @@ class VideoViewSet(viewsets.ModelViewSet):
                    "analyzed frame in the video, ordered chronologically "
                    "by timestamp.",
         tags=["Video Analysis"],
+        parameters=OPTIONAL_PAGE_PARAMETERS,
         responses={
             200: OpenApiResponse(
                 description="Emotion frames retrieved successfully",
@@ -406,26 +554,30 @@ class VideoViewSet(viewsets.ModelViewSet):
         }
     )
     @action(detail=True, methods=['get'], url_path='frames')
+    @cache_video_response(paginated_only=True)
     def emotion_frames(self, request, pk=None):
         """Get emotion analysis frames for this video"""
-        try:
-            video = self.get_object()
-            frames = EmotionAnalysis.objects.filter(
-                video=video
-            ).order_by('timestamp')
-            serializer = EmotionAnalysisSerializer(frames, many=True)
-            return Response(serializer.data)
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        video = self.get_object()
+        # Read the serializer's fields as plain dicts; the renderer formats the
+        # UUIDs and datetimes exactly as EmotionAnalysisSerializer would
+        frames = EmotionAnalysis.objects.filter(
+            video=video
+        ).order_by('timestamp').values(*EmotionAnalysisSerializer.Meta.fields)
+        
+        # Only one page of rows is loaded when the client asks for ?limit=
+        paginator = OptionalLimitOffsetPagination()
+        page = paginator.paginate_queryset(frames, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(page)
+        # Fetch through a server-side cursor so the driver never buffers every row at once
+        return Response(list(frames.iterator(chunk_size=2000)))
     
     @extend_schema(
         summary="Get emotion timeline",
         description="Retrieve emotion timeline segments showing periods of "
                    "consistent emotional states throughout the video.",
         tags=["Video Analysis"],
+        parameters=OPTIONAL_PAGE_PARAMETERS,
         responses={
             200: OpenApiResponse(
                 description="Emotion timeline retrieved successfully"
@@ -433,20 +585,20 @@ class VideoViewSet(viewsets.ModelViewSet):
         }
     )
     @action(detail=True, methods=['get'], url_path='timeline')
+    @cache_video_response()
     def emotion_timeline(self, request, pk=None):
         """Get emotion timeline for this video"""
-        try:
-            video = self.get_object()
-            timeline = EmotionTimeline.objects.filter(
-                video=video
-            ).order_by('start_time')
-            serializer = EmotionTimelineSerializer(timeline, many=True)
-            return Response(serializer.data)
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        video = self.get_object()
+        # Read the serializer's fields as plain dicts, as for emotion_frames
+        timeline = EmotionTimeline.objects.filter(
+            video=video
+        ).order_by('start_time').values(*EmotionTimelineSerializer.Meta.fields)
+        
+        paginator = OptionalLimitOffsetPagination()
+        page = paginator.paginate_queryset(timeline, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(page)
+        return Response(list(timeline.iterator(chunk_size=2000)))
     
     @extend_schema(
         summary="Get emotion analysis summary",
@@ -496,23 +648,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         }
     )
     @action(detail=True, methods=['get'], url_path='summary')
+    @cache_video_response()
     def emotion_summary(self, request, pk=None):
         """Get emotion analysis summary for this video"""
-        try:
-            video = self.get_object()
-            summary = EmotionAnalysisSummary.objects.filter(video=video).first()
-            if summary:
-                serializer = EmotionAnalysisSummarySerializer(summary)
-                return Response(serializer.data)
-            else:
-                return Response(
-                    {'message': 'No summary available'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-        except Exception as e:
+        video = self.get_object()
+        summary = EmotionAnalysisSummary.objects.filter(video=video).first()
+        if summary:
+            serializer = EmotionAnalysisSummarySerializer(summary)
+            return Response(serializer.data)
+        else:
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'message': 'No summary available'},
+                status=status.HTTP_404_NOT_FOUND
             )
     
     @extend_schema(
@@ -551,31 +698,36 @@ class VideoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download_data_csv(self, request, pk=None):
         """Download emotion analysis data as CSV"""
-        try:
-            video = self.get_object()
-            
-            # Check if analysis is complete
-            if video.status != 'completed':
-                return Response(
-                    {'error': 'Video analysis is not complete yet'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        video = self.get_object()
+        
+        # Check if analysis is complete
+        if video.status != 'completed':
+            return Response(
+                {'error': 'Video analysis is not complete yet'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            # Generate CSV content
-            csv_content = video.get_emotion_data_csv()
+        # Serve the CSV exported when the analysis completed
+        if video.data_csv_file:
+            try:
+                return FileResponse(
+                    video.data_csv_file.open('rb'),
+                    as_attachment=True,
+                    filename=f"{video.title}_emotion_data.csv",
+                    content_type='text/csv'
+                )
+            except OSError:
+                logger.warning(f"Exported CSV of video {video.pk} is missing, regenerating it")
 
-            # Create HTTP response with CSV file
-            response = HttpResponse(csv_content, content_type='text/csv')
-            response['Content-Disposition'] = (
-                f'attachment; filename="{video.title}_emotion_data.csv"'
-            )
+        # Otherwise stream CSV content as it is generated
+        response = StreamingHttpResponse(
+            video.get_emotion_data_csv(), content_type='text/csv'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{video.title}_emotion_data.csv"'
+        )
 
-            return response
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return response
     
     @extend_schema(
         summary="Download emotion timeline as CSV",
@@ -614,30 +766,21 @@ class VideoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download_timeline_csv(self, request, pk=None):
         """Download emotion timeline as CSV"""
-        try:
-            video = self.get_object()
-            
-            # Check if analysis is complete
-            if video.status != 'completed':
-                return Response(
-                    {'error': 'Video analysis is not complete yet'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Generate CSV content
-            csv_content = video.get_emotion_timeline_csv()
-
-            # Create HTTP response with CSV file
-            response = HttpResponse(csv_content, content_type='text/csv')
-            response['Content-Disposition'] = (
-                f'attachment; filename="{video.title}_emotion_timeline.csv"'
-            )
-
-            return response
-        except Exception as e:
+        video = self.get_object()
+        
+        # Check if analysis is complete
+        if video.status != 'completed':
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Video analysis is not complete yet'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Stream CSV content as it is generated
+        response = StreamingHttpResponse(
+            video.get_emotion_timeline_csv(), content_type='text/csv'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{video.title}_emotion_timeline.csv"'
+        )
 
+        return response
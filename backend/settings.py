@@ -131,9 +131,21 @@ DATABASES = {
         "PASSWORD": env("DB_PASSWORD"),
         "HOST": env("DB_HOST"),
         "PORT": env("DB_PORT"),
+        # QuerySet.iterator() streams large frame and CSV queries through server-side
+        # cursors; set to True behind PgBouncer in transaction pooling mode
+        "DISABLE_SERVER_SIDE_CURSORS": env.bool("DB_DISABLE_SERVER_SIDE_CURSORS", default=False),
     }
 }
 
+# Cache
+# Response and list count caches must be shared by every gunicorn and Celery
+# process, so deployments point CACHE_URL at Redis (e.g. redis://127.0.0.1:6379/1);
+# the per-process default only suits a single development server
+
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+}
+
 AUTH_USER_MODEL = "authentication.InterfaceUser"
 
 # Password validation
@@ -209,6 +221,7 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "EXCEPTION_HANDLER": "analysis.exceptions.custom_exception_handler",
     "PAGE_SIZE": 100,
 }
 
@@ -306,4 +319,32 @@ CELERY_RESULT_SERIALIZER = "json"
 # Add these new settings
 CELERY_BROKER_CONNECTION_RETRY = True
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
-CELERY_BROKER_CONNECTION_MAX_RETRIES = 10
\ No newline at end of file
+CELERY_BROKER_CONNECTION_MAX_RETRIES = 10
+
+# Emotion analysis runs on its own queue, consumed by the inference (GPU) workers:
+#   celery -A backend worker -Q gpu_analysis -c 1 --max-tasks-per-child=4
+EMOTION_ANALYSIS_QUEUE = env("EMOTION_ANALYSIS_QUEUE", default="gpu_analysis")
+CELERY_TASK_ROUTES = {
+    "analysis.tasks.analyze_video_emotions": {"queue": EMOTION_ANALYSIS_QUEUE},
+}
+# Let user-requested reanalysis overtake queued uploads
+CELERY_TASK_QUEUE_MAX_PRIORITY = 10
+CELERY_TASK_DEFAULT_PRIORITY = 5
+# Emotion analysis
+# Inference backend: "tensorflow" (float32), "tflite-fp16" (float16 weights, XNNPACK kernels)
+# "tflite-int8" (fully quantized, calibrated on the face crops in EMOTION_MODEL_CALIBRATION_DIR)
+# or "onnx" (ONNX Runtime, needs the onnxruntime and tf2onnx packages)
+EMOTION_MODEL_BACKEND = env("EMOTION_MODEL_BACKEND", default="tensorflow")
+EMOTION_MODEL_CALIBRATION_DIR = env(
+    "EMOTION_MODEL_CALIBRATION_DIR", default=os.path.join(BASE_DIR, "analysis/cnn/test_images")
+)
+# Crop frames to the largest detected face before classifying them; frames without a face are skipped
+EMOTION_DETECT_FACES = env.bool("EMOTION_DETECT_FACES", default=False)
+# Ask FFmpeg for hardware video decoding (VAAPI, NVDEC, ...), falling back to software
+EMOTION_HW_DECODE = env.bool("EMOTION_HW_DECODE", default=True)
+# Number of frame ranges of one video analyzed concurrently by a worker
+EMOTION_MAX_WORKERS = env.int("EMOTION_MAX_WORKERS", default=min(4, os.cpu_count() or 1))
+# Cache of decoded model inputs, so re-analyzing a video skips decoding it; off (0) by default.
+# Keep the directory outside MEDIA_ROOT, as the cached frames must not be publicly served
+EMOTION_FRAME_CACHE_DIR = env("EMOTION_FRAME_CACHE_DIR", default=os.path.join(BASE_DIR, "frame_cache"))
+EMOTION_FRAME_CACHE_MAX_BYTES = env.int("EMOTION_FRAME_CACHE_MAX_BYTES", default=0)